@@ -0,0 +1,370 @@
+import socket, json, argparse, math
+import os, sys, time, select
+import subprocess, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROMPT = "\n> "
+
+def parse_ints(s: str) -> list[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty sample list."""
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+def udp_call(target, msg, timeout=1.0):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.settimeout(timeout)
+        s.sendto(json.dumps(msg).encode(), target)
+        data, _ = s.recvfrom(65535)
+        return json.loads(data.decode("utf-8"))
+    except socket.timeout:
+        return {"status": "FAILURE", "error": "timeout"}
+    finally:
+        s.close()
+
+def spawn(script, *args, stdout=subprocess.DEVNULL, stdin=None):
+    return subprocess.Popen([sys.executable, "-u", os.path.join(HERE, script), *map(str, args)],
+                            stdin=stdin, stdout=stdout, stderr=subprocess.STDOUT)
+
+def read_until(proc, marker: str, timeout: float) -> str:
+    """Read proc.stdout until the accumulated text ends with marker."""
+    fd = proc.stdout.fileno()
+    buf = b""
+    deadline = time.monotonic() + timeout
+    want = marker.encode()
+    while not buf.endswith(want):
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"timed out waiting for {marker!r}; got tail {buf[-200:]!r}")
+        ready, _, _ = select.select([fd], [], [], left)
+        if not ready:
+            continue
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            raise RuntimeError(f"process exited; tail {buf[-200:]!r}")
+        buf += chunk
+    return buf.decode("utf-8", errors="replace")
+
+def repl(proc, line: str, timeout: float) -> tuple[str, float]:
+    """Send one command to the user.py REPL; return (output, seconds)."""
+    t0 = time.perf_counter()
+    proc.stdin.write((line + "\n").encode())
+    proc.stdin.flush()
+    out = read_until(proc, PROMPT, timeout)
+    return out, time.perf_counter() - t0
+
+def proc_usage(pid: int) -> dict:
+    """CPU seconds and peak RSS (KiB) of a live process, from /proc (Linux only)."""
+    usage = {"cpu_s": None, "peak_rss_kb": None}
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        usage["cpu_s"] = (int(fields[11]) + int(fields[12])) / ticks
+        with open(f"/proc/{pid}/status") as f:
+            for ln in f:
+                if ln.startswith("VmHWM:"):
+                    usage["peak_rss_kb"] = int(ln.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return usage
+
+def child_pids(pid: int) -> list[int]:
+    """Live child processes of pid (Linux only), e.g. user.py's encode workers."""
+    out = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out.extend(int(c) for c in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return out
+
+def add_usage(total: dict, usage: dict) -> None:
+    for k, v in usage.items():
+        if v is None:
+            continue
+        if k == "peak_rss_kb":
+            total[k] = max(total.get(k) or 0, v)
+        else:
+            total[k] = (total.get(k) or 0) + v
+
+def summarize(key: dict, samples: list[float], nbytes: int) -> dict:
+    rec = dict(key)
+    rec["count"] = len(samples)
+    rec["p50_ms"] = round(percentile(samples, 50) * 1000, 3)
+    rec["p99_ms"] = round(percentile(samples, 99) * 1000, 3)
+    total = sum(samples)
+    rec["throughput_mbps"] = round(nbytes * len(samples) / total / 1e6, 3) if total > 0 else None
+    return rec
+
+def record_key(rec: dict) -> tuple:
+    return (rec["workload"], rec["n"], rec["striping_unit"], rec["size"], rec.get("workers", 0))
+
+def compare(results: list[dict], baseline: list[dict]) -> list[dict]:
+    """Relative change of each result against the matching baseline record."""
+    base = {record_key(r): r for r in baseline}
+    out = []
+    for r in results:
+        b = base.get(record_key(r))
+        if not b:
+            continue
+        row = {"workload": r["workload"], "n": r["n"], "striping_unit": r["striping_unit"], "size": r["size"],
+               "workers": r.get("workers", 0)}
+        for metric in ("throughput_mbps", "p50_ms", "p99_ms"):
+            old, new = b.get(metric), r.get(metric)
+            row[metric] = round((new - old) / old * 100, 1) if old and new is not None else None
+        out.append(row)
+    return out
+
+def gen_data(kind: str, size: int) -> bytes:
+    """Benchmark payload: incompressible, compressible text, or mostly-zero sparse."""
+    if kind == "text":
+        words = b"stripe parity block disk manager user copy read rebuild ".split()
+        out = bytearray()
+        while len(out) < size:
+            out += words[len(out) % len(words)] + b" "
+        return bytes(out[:size])
+    if kind == "sparse":
+        out = bytearray(size)
+        for off in range(0, size, 65536):
+            out[off:off + 512] = os.urandom(min(512, size - off))
+        return bytes(out)
+    return os.urandom(size)
+
+def dss_disks(mgr, dss_name):
+    r = udp_call(mgr, {"cmd": "ls", "args": {}})
+    for d in r.get("listing", {}).get("dsses", []):
+        if d.get("dss_name") == dss_name:
+            return d.get("disks", [])
+    return []
+
+def run_config(user, mgr, disk_ports, files, bulk, n, b, repeat, timeout, tmpdir, dss_options=""):
+    """Run every workload for one (n, striping_unit) DSS and return records."""
+    records = []
+    dss = f"bench{n}x{b}"
+    out, _ = repl(user, f"configure {dss} {n} {b} {dss_options}".rstrip(), timeout)
+    if "SUCCESS" not in out:
+        raise RuntimeError(f"configure failed: {out}")
+
+    for size, path in files:
+        name = os.path.basename(path)
+        key = {"n": n, "striping_unit": b, "size": size}
+
+        samples = []
+        for _ in range(repeat):
+            out, dt = repl(user, f"copy {dss} {path}", timeout)
+            if "SUCCESS" not in out.rpartition("copy-complete ->")[2]:
+                raise RuntimeError(f"copy failed: {out}")
+            samples.append(dt)
+        records.append(summarize({"workload": "copy", **key}, samples, size))
+
+        dst = os.path.join(tmpdir, name + ".out")
+        samples = []
+        for _ in range(repeat):
+            out, dt = repl(user, f"read {dss} {name} {dst}", timeout)
+            if "SHA256 match" not in out:
+                raise RuntimeError(f"read failed: {out}")
+            samples.append(dt)
+        records.append(summarize({"workload": "read", **key}, samples, size))
+
+        victim = disk_ports[dss_disks(mgr, dss)[0]]
+        udp_call(victim, {"cmd": "set-mode", "args": {"state": "fail"}})
+        samples = []
+        try:
+            for _ in range(repeat):
+                out, dt = repl(user, f"read {dss} {name} {dst}", timeout)
+                if "SHA256 match" not in out:
+                    raise RuntimeError(f"degraded read failed: {out}")
+                samples.append(dt)
+        finally:
+            udp_call(victim, {"cmd": "set-mode", "args": {"state": "normal"}})
+        records.append(summarize({"workload": "degraded-read", **key}, samples, size))
+
+    stored = sum(size for size, _ in files)
+    if bulk:
+        bulk_dir, bulk_files, bulk_size = bulk
+        samples = []
+        for _ in range(repeat):
+            out, dt = repl(user, f"copy-bulk {dss} {bulk_dir}", timeout)
+            if f"{bulk_files} copied, 0 failed" not in out:
+                raise RuntimeError(f"copy-bulk failed: {out}")
+            samples.append(dt)
+        rec = summarize({"workload": "bulk-copy", "n": n, "striping_unit": b, "size": bulk_size},
+                        samples, bulk_files * bulk_size)
+        rec["files"] = bulk_files
+        rec["files_per_s"] = round(bulk_files * len(samples) / sum(samples), 1)
+        records.append(rec)
+        stored += bulk_files * bulk_size
+
+    key = {"n": n, "striping_unit": b, "size": stored}
+    samples = []
+    for _ in range(repeat):
+        out, dt = repl(user, f"disk-failure {dss}", timeout)
+        if "SUCCESS" not in out.rpartition("recovery-complete ->")[2]:
+            raise RuntimeError(f"rebuild failed: {out}")
+        samples.append(dt)
+    records.append(summarize({"workload": "rebuild", **key}, samples, stored))
+
+    samples = []
+    for _ in range(repeat):
+        out, dt = repl(user, f"disk-failure {dss} peer", timeout)
+        if "SUCCESS" not in out.rpartition("recovery-complete ->")[2]:
+            raise RuntimeError(f"peer rebuild failed: {out}")
+        samples.append(dt)
+    records.append(summarize({"workload": "peer-rebuild", **key}, samples, stored))
+
+    out, dt = repl(user, f"decommission {dss}", timeout)
+    if "SUCCESS" not in out.rpartition("decommission-complete ->")[2]:
+        raise RuntimeError(f"decommission failed: {out}")
+    records.append(summarize({"workload": "decommission", **key}, [dt], stored))
+    return records
+
+def print_table(records: list[dict], deltas: list[dict]) -> None:
+    delta = {record_key(d): d for d in deltas}
+    print(f"{'workload':<14}{'n':>3}{'su':>8}{'size':>10}{'w':>3}{'MB/s':>10}{'p50 ms':>10}{'p99 ms':>10}  vs baseline")
+    for r in records:
+        d = delta.get(record_key(r))
+        note = ""
+        if d:
+            note = f"tput {d['throughput_mbps']:+}% p50 {d['p50_ms']:+}% p99 {d['p99_ms']:+}%"
+        tput = r["throughput_mbps"] if r["throughput_mbps"] is not None else "-"
+        print(f"{r['workload']:<14}{r['n']:>3}{r['striping_unit']:>8}{r['size']:>10}{r.get('workers', 0):>3}{tput:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}  {note}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark manager.py, disk.py and user.py on loopback.")
+    ap.add_argument("--n", default="3,5", help="comma-separated DSS widths")
+    ap.add_argument("--striping-units", default="1024,4096,16384")
+    ap.add_argument("--sizes", default="1000,65536,1048576", help="comma-separated file sizes in bytes")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--bulk-files", type=int, default=200, help="files per copy-bulk run (0 to skip)")
+    ap.add_argument("--bulk-size", type=int, default=1000, help="size of each copy-bulk file")
+    ap.add_argument("--data", default="random", choices=["random", "text", "sparse"],
+                    help="content of the generated files")
+    ap.add_argument("--dss-options", default="", help='extra configure options, e.g. "holes zlib"')
+    ap.add_argument("--encode-workers", default="0",
+                    help="comma-separated user.py --encode-workers values; every workload runs once per value")
+    ap.add_argument("--base-port", type=int, default=47000)
+    ap.add_argument("--timeout", type=float, default=300.0, help="seconds allowed per command")
+    ap.add_argument("--no-stats", action="store_true",
+                    help="start manager and disks with instrumentation off (to measure its overhead)")
+    ap.add_argument("--out", help="write JSON results here")
+    ap.add_argument("--baseline", help="JSON results from an earlier run to compare against "
+                                       "(bench-baseline.json holds the default run on the baseline tree)")
+    ap.add_argument("--fail-on-regression", type=float, default=None, metavar="PCT",
+                    help="exit non-zero if any throughput drops more than PCT percent")
+    args = ap.parse_args()
+
+    widths = parse_ints(args.n)
+    units = parse_ints(args.striping_units)
+    sizes = parse_ints(args.sizes)
+    worker_counts = parse_ints(args.encode_workers)
+
+    mgr_port = args.base_port
+    mgr = ("127.0.0.1", mgr_port)
+    procs = {}
+    disk_ports = {}
+    tmpdir = tempfile.mkdtemp(prefix="dss-bench-")
+    records = []
+    try:
+        server_flags = ["--no-stats"] if args.no_stats else []
+        procs["manager"] = spawn("manager.py", mgr_port, *server_flags)
+        for _ in range(50):
+            if udp_call(mgr, {"cmd": "ls", "args": {}}, timeout=0.2).get("error") != "timeout":
+                break
+        else:
+            raise RuntimeError("manager did not come up")
+
+        for i in range(max(widths)):
+            name = f"bdisk{i}"
+            m_port, c_port = mgr_port + 10 + 2 * i, mgr_port + 11 + 2 * i
+            p = spawn("disk.py", name, "127.0.0.1", mgr_port, m_port, c_port, *server_flags,
+                      stdout=subprocess.PIPE)
+            read_until(p, "Disk registered. Make sure to press Ctrl+C to exit.\n", 10)
+            procs[name] = p
+            disk_ports[name] = ("127.0.0.1", c_port)
+
+        files = []
+        for size in sizes:
+            path = os.path.join(tmpdir, f"bench-{size}.bin")
+            with open(path, "wb") as f:
+                f.write(gen_data(args.data, size))
+            files.append((size, path))
+
+        bulk = None
+        if args.bulk_files > 0:
+            bulk_dir = os.path.join(tmpdir, "bulk")
+            os.mkdir(bulk_dir)
+            for i in range(args.bulk_files):
+                with open(os.path.join(bulk_dir, f"small-{i:05d}.bin"), "wb") as f:
+                    f.write(gen_data(args.data, args.bulk_size))
+            bulk = (bulk_dir, args.bulk_files, args.bulk_size)
+
+        t0 = time.perf_counter()
+        user_usage = {}
+        for workers in worker_counts:
+            # A fresh user.py per worker count; its usage is read before it goes.
+            user = spawn("user.py", f"bench{workers}", "127.0.0.1", mgr_port, mgr_port + 1, mgr_port + 2,
+                         "--encode-workers", workers, stdout=subprocess.PIPE, stdin=subprocess.PIPE)
+            procs["user"] = user
+            read_until(user, PROMPT, 10)
+            for n in widths:
+                for b in units:
+                    for rec in run_config(user, mgr, disk_ports, files, bulk, n, b, args.repeat, args.timeout,
+                                          tmpdir, args.dss_options):
+                        records.append({**rec, "workers": workers})
+            for pid in [user.pid, *child_pids(user.pid)]:
+                add_usage(user_usage, proc_usage(pid))
+            # quit rather than kill, so the client shuts its encode workers down
+            user.stdin.write(b"quit\n")
+            user.stdin.flush()
+            user.wait(args.timeout)
+        wall = time.perf_counter() - t0
+
+        usage = {"manager": proc_usage(procs["manager"].pid), "disks": {}, "user": user_usage}
+        for name in disk_ports:
+            add_usage(usage["disks"], proc_usage(procs[name].pid))
+
+        server_stats = {"manager": udp_call(mgr, {"cmd": "stats", "args": {}}).get("stats")}
+        for name, target in disk_ports.items():
+            server_stats[name] = udp_call(target, {"cmd": "stats", "args": {}}).get("stats")
+    finally:
+        for p in procs.values():
+            p.kill()
+            p.wait()
+
+    report = {
+        "config": {"n": widths, "striping_units": units, "sizes": sizes, "repeat": args.repeat,
+                   "bulk_files": args.bulk_files, "bulk_size": args.bulk_size, "encode_workers": worker_counts,
+                   "data": args.data, "dss_options": args.dss_options, "stats": not args.no_stats},
+        "python": sys.version.split()[0],
+        "wall_s": round(wall, 3),
+        "processes": usage,
+        "results": records,
+        "server_stats": server_stats,
+    }
+    deltas = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            deltas = compare(records, json.load(f).get("results", []))
+        report["baseline"] = {"path": args.baseline, "delta_pct": deltas}
+
+    print_table(records, deltas)
+    print("processes:", json.dumps(usage))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print("wrote", args.out)
+
+    if args.fail_on_regression is not None:
+        worst = [d for d in deltas if d["throughput_mbps"] is not None and d["throughput_mbps"] < -args.fail_on_regression]
+        if worst:
+            print(f"{len(worst)} result(s) regressed by more than {args.fail_on_regression}%")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
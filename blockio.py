@@ -0,0 +1,172 @@
+import json, socket, time
+
+RCVBUF = 4 * 1024 * 1024
+DATAGRAM = 65536  # receive buffer size: the largest UDP payload fits
+
+class BufferPool:
+    """Reusable bytearrays in power-of-two size classes, so receive and send
+    buffers on the block path are recycled rather than allocated per datagram.
+    get() and put() are plain list pops and appends, safe across threads
+    under the GIL. Counts fresh allocations against reuses for the stats."""
+
+    def __init__(self, smallest: int = 4096, largest: int = DATAGRAM, keep: int = 16):
+        self.sizes = []
+        size = smallest
+        while size < largest:
+            self.sizes.append(size)
+            size *= 2
+        self.sizes.append(largest)
+        self.keep = keep
+        self.free = {size: [] for size in self.sizes}
+        self.counts = {"allocs": 0, "reuses": 0}
+
+    def get(self, size: int) -> bytearray:
+        cls = next((c for c in self.sizes if c >= size), None)
+        if cls is None:
+            self.counts["allocs"] += 1
+            return bytearray(size)  # oversized: not pooled
+        try:
+            buf = self.free[cls].pop()
+            self.counts["reuses"] += 1
+            return buf
+        except IndexError:
+            self.counts["allocs"] += 1
+            return bytearray(cls)
+
+    def put(self, buf: bytearray) -> None:
+        free = self.free.get(len(buf))
+        if free is not None and len(free) < self.keep:
+            free.append(buf)
+
+    def snapshot(self, bytes_moved: int = 0) -> dict:
+        out = dict(self.counts)
+        out["pooled"] = sum(len(f) for f in self.free.values())
+        if bytes_moved:
+            out["allocs_per_mb"] = round(out["allocs"] / (bytes_moved / 1e6), 4)
+        return out
+
+POOL = BufferPool()
+
+_SPLICE = "\x00block\x00"
+_SPLICE_JSON = json.dumps(_SPLICE)
+
+def encode_msg(msg: dict) -> list:
+    """Wire form of msg as a list of buffers for sendmsg. A block payload held as
+    base64 bytes under "block_b64" (see striping.encode_block), either in msg or
+    in msg["args"], is spliced in as it is instead of going through str and
+    json.dumps and being encoded again. It is the last string in the message,
+    so the placeholder is found from the right."""
+    args = msg.get("args")
+    if isinstance(args, dict) and isinstance(args.get("block_b64"), (bytes, bytearray)):
+        blob = args["block_b64"]
+        msg = {**msg, "args": {**args, "block_b64": _SPLICE}}
+    elif isinstance(msg.get("block_b64"), (bytes, bytearray)):
+        blob = msg["block_b64"]
+        msg = {**msg, "block_b64": _SPLICE}
+    else:
+        return [json.dumps(msg).encode()]
+    head, _, tail = json.dumps(msg).rpartition(_SPLICE_JSON)
+    return [(head + '"').encode(), blob, ('"' + tail).encode()]
+
+def send_msg(sock, msg: dict, addr) -> int:
+    """Send msg on a blocking UDP socket as one datagram, gathering the spliced
+    parts with sendmsg where the platform has it. Returns the bytes sent."""
+    parts = encode_msg(msg)
+    if len(parts) > 1 and hasattr(sock, "sendmsg"):
+        return sock.sendmsg(parts, [], 0, addr)
+    return sock.sendto(b"".join(parts), addr)
+
+def decode_msg(buf: bytearray, n: int):
+    """The JSON message in the first n bytes of a receive buffer, or None. The text
+    is decoded straight from the buffer, without an interim bytes copy."""
+    try:
+        with memoryview(buf)[:n] as view:
+            msg = json.loads(str(view, "utf-8"))
+    except ValueError:
+        return None
+    return msg if isinstance(msg, dict) else None
+
+def take_page(items, budget: int) -> tuple[list, int]:
+    """The longest prefix of items whose JSON fits in budget bytes, and its size.
+    The first item is always taken so that paging makes progress."""
+    out, size = [], 0
+    for item in items:
+        est = len(json.dumps(item)) + 2
+        if out and size + est > budget:
+            break
+        out.append(item)
+        size += est
+    return out, size
+
+def open_socket() -> socket.socket:
+    """UDP socket for batched block traffic, with room for a window of replies."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    return s
+
+def window_size(block_bytes: int, blocks_per_item: int, budget: int = 512 * 1024) -> int:
+    """Items (stripes) per batch so one burst of replies stays inside the socket buffer."""
+    return max(1, budget // max(1, block_bytes * blocks_per_item))
+
+def batch_call(sock, ids, reqs, timeout: float, retries: int = 3) -> list:
+    """Send every (target, cmd, args) in reqs from a blocking socket and match replies
+    by req_id. Returns the replies in order, None where no SUCCESS came back;
+    unanswered or failed requests are resent up to `retries` times in total."""
+    out = [None] * len(reqs)
+    buf = POOL.get(DATAGRAM)
+    try:
+        for _ in range(retries):
+            pending = {}
+            for i, (target, cmd, args) in enumerate(reqs):
+                if out[i] is None:
+                    rid = next(ids)
+                    pending[rid] = i
+                    send_msg(sock, {"cmd": cmd, "args": args, "req_id": rid}, target)
+            deadline = time.monotonic() + timeout
+            while pending:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                sock.settimeout(left)
+                try:
+                    r = decode_msg(buf, sock.recvfrom_into(buf)[0])
+                except socket.timeout:
+                    break
+                except OSError:
+                    continue
+                if r is None:
+                    continue
+                i = pending.pop(r.get("req_id"), None)
+                if i is not None and r.get("status") == "SUCCESS":
+                    out[i] = r
+            if all(r is not None for r in out):
+                break
+    finally:
+        POOL.put(buf)
+    return out
+
+def call_until(sock, ids, target, cmd: str, args: dict, timeout: float, deadline: float):
+    """Send one request from a blocking socket every `timeout` seconds until a
+    reply to any of the attempts arrives or time.monotonic() passes deadline.
+    Returns the reply whatever its status, or None if none came in time."""
+    sent = set()
+    buf = POOL.get(DATAGRAM)
+    try:
+        while time.monotonic() < deadline:
+            rid = next(ids)
+            sent.add(rid)
+            send_msg(sock, {"cmd": cmd, "args": args, "req_id": rid}, target)
+            until = min(deadline, time.monotonic() + timeout)
+            while (left := until - time.monotonic()) > 0:
+                sock.settimeout(left)
+                try:
+                    r = decode_msg(buf, sock.recvfrom_into(buf)[0])
+                except socket.timeout:
+                    break
+                except OSError:
+                    continue
+                if r is not None and r.get("req_id") in sent:
+                    return r
+    finally:
+        POOL.put(buf)
+    return None
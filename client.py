@@ -0,0 +1,841 @@
+import socket, json, asyncio
+import os, glob, hashlib, random, itertools, secrets, time, contextlib
+import tracing, blockio, stripepool
+from blockio import take_page
+from striping import (total_stripes_for_size, xor_bytes, parity_disk,
+                      data_disk_order, encode_stripe, encode_block, decode_block, pack_extents)
+
+MAX_RETRIES = 5
+BULK_BATCH_BYTES = 32000  # keep each multi-file copy-complete well inside one datagram
+DISCARD_PAGE_BYTES = 16000  # object names per copy-complete discard list or copy-abort
+LEASE_MARGIN = 0.1  # fraction of a lease's ttl given up to clock skew and delays
+PEER_POLL = 0.05  # longest wait between rebuild-status polls during a peer rebuild
+BUSY_POLL = 0.2   # longest wait between retries of a command the manager refused as busy
+
+class DSSError(Exception):
+    """The manager or a disk refused an operation; .error is the protocol error string."""
+    def __init__(self, error: str, resp: dict | None = None):
+        super().__init__(error)
+        self.error = error
+        self.resp = resp if resp is not None else {"status": "FAILURE", "error": error}
+
+def guess_my_ip(to_ip: str, to_port: int) -> str:
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect((to_ip, to_port))
+        ip = s.getsockname()[0]
+    finally:
+        s.close()
+    return ip
+
+def check(resp: dict) -> dict:
+    if resp.get("status") != "SUCCESS":
+        raise DSSError(resp.get("error", "unknown error"), resp)
+    return resp
+
+class _Endpoint(asyncio.DatagramProtocol):
+    """One connected UDP socket to a manager or disk. Replies are matched to
+    requests by the req_id the servers echo back, so many requests can share it."""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        try:
+            transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, blockio.RCVBUF)
+        except OSError:
+            pass
+
+    def datagram_received(self, data, addr):
+        try:
+            resp = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return
+        if not isinstance(resp, dict):
+            return
+        fut = self.pending.pop(resp.pop("req_id", None), None)
+        if fut is not None and not fut.done():
+            fut.set_result(resp)
+
+    def error_received(self, exc):
+        # ICMP port unreachable on a connected socket: the peer is gone, fail fast.
+        self._fail_all({"status": "FAILURE", "error": f"unreachable: {exc}"})
+
+    def connection_lost(self, exc):
+        self._fail_all({"status": "FAILURE", "error": "connection closed"})
+
+    def _fail_all(self, resp):
+        pending, self.pending = self.pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_result(dict(resp))
+
+    async def request(self, msg: dict, req_id: int, timeout: float) -> dict:
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = fut
+        try:
+            parts = blockio.encode_msg({**msg, "req_id": req_id})
+            if len(parts) == 1:
+                self.transport.sendto(parts[0])
+            else:
+                # Gather a block write into a pooled buffer: the payload is copied
+                # once, and the transport copies only if it has to queue it.
+                size = sum(len(p) for p in parts)
+                buf = blockio.POOL.get(size)
+                pos = 0
+                for p in parts:
+                    buf[pos:pos + len(p)] = p
+                    pos += len(p)
+                with memoryview(buf)[:size] as view:
+                    self.transport.sendto(view)
+                blockio.POOL.put(buf)
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:  # not yet the builtin TimeoutError before 3.11
+            return {"status": "FAILURE", "error": "timeout"}
+        finally:
+            self.pending.pop(req_id, None)
+
+class DSSClient:
+    """Async client for the manager/disk protocol.
+
+    One client keeps a single manager socket and a pool of per-disk sockets,
+    shared by every call on one event loop. Reads run concurrently. Copies,
+    disk failures and decommissions hold the manager's lock, so the client
+    runs them one at a time. A command the manager refuses as busy (another
+    client holds the lock) is retried for up to busy_wait seconds. Every
+    high-level call accepts timeout=; on timeout or cancellation the
+    manager-side state (copy lock, reads in progress, recovery) is released
+    before returning.
+
+    With leases=True, read-prepare replies come with a manager lease and are
+    cached, so repeated reads of a file go straight to the disks until it runs out.
+
+    With encode_workers > 0, parity and wire encoding for large copies and for
+    rebuilds run on that many worker processes (see stripepool), overlapped with
+    the network I/O; 0 keeps everything on the event loop's thread.
+    """
+
+    def __init__(self, user_name: str, manager_ip: str, manager_port: int, *,
+                 m_port: int = 0, block_timeout: float = 1.0, manager_timeout: float = 5.0,
+                 leases: bool = True, encode_workers: int = 0, busy_wait: float = 30.0):
+        self.user_name = user_name
+        self.mgr = (manager_ip, manager_port)
+        self.m_port = m_port
+        self.block_timeout = block_timeout
+        self.manager_timeout = manager_timeout
+        self.busy_wait = busy_wait
+        self._op_lock = asyncio.Lock()  # held by operations that take the manager's lock
+        self._mgr_ep = None
+        self._disks = {}
+        self._ids = itertools.count(1)
+        self.leases = leases
+        self._leases = {}  # (dss_name, file_name) -> read lease with its read-prepare reply
+        self.encode_workers = encode_workers
+        self._pool = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        _, self._mgr_ep = await loop.create_datagram_endpoint(
+            _Endpoint, local_addr=("0.0.0.0", self.m_port), remote_addr=self.mgr)
+        if self.encode_workers:
+            await self._stripe_pool().start()
+        return self
+
+    async def close(self):
+        if self._leases:
+            await self._release_leases()
+        eps = [self._mgr_ep] if self._mgr_ep else []
+        for t in self._disks.values():
+            if t.done() and not t.cancelled() and t.exception() is None:
+                eps.append(t.result()[1])
+        for ep in eps:
+            ep.transport.close()
+        self._disks.clear()
+        self._mgr_ep = None
+        if self._pool:
+            self._pool.close()
+            self._pool = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _disk_ep(self, target):
+        task = self._disks.get(target)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = self._disks[target] = asyncio.ensure_future(
+                loop.create_datagram_endpoint(_Endpoint, remote_addr=target))
+        _, ep = await asyncio.shield(task)
+        return ep
+
+    async def call(self, cmd: str, args: dict | None = None, timeout: float | None = None) -> dict:
+        """Send one manager command and return its raw reply."""
+        msg = {"cmd": cmd, "args": args or {}}
+        tracing.event("debug", "send", to=self.mgr, msg=msg)
+        resp = await self._mgr_ep.request(msg, next(self._ids), timeout or self.manager_timeout)
+        tracing.event("debug", "recv", frm="manager", resp=resp)
+        return resp
+
+    async def call_when_free(self, cmd: str, args: dict | None = None) -> dict:
+        """call(), retried with backoff for up to busy_wait seconds while the
+        manager refuses it because an operation holds its lock."""
+        deadline = time.monotonic() + self.busy_wait
+        poll = 0.01
+        while True:
+            resp = await self.call(cmd, args)
+            if not str(resp.get("error", "")).startswith("busy:") or time.monotonic() >= deadline:
+                return resp
+            await asyncio.sleep(min(poll, max(0.0, deadline - time.monotonic())))
+            poll = min(poll * 2, BUSY_POLL)
+
+    async def call_answered(self, cmd: str, args: dict | None = None) -> dict:
+        """call(), resent while no reply comes back, for commands whose loss would
+        strand state on the manager. Only the caller's timeout= bounds it."""
+        while True:
+            resp = await self.call(cmd, args)
+            if resp.get("error") != "timeout":
+                return resp
+
+    async def disk_call(self, ep: dict, cmd: str, args: dict | None = None, timeout: float | None = None) -> dict:
+        """Send one command to a disk's content port and return its raw reply.
+        Disks the manager reports as not alive fail at once instead of timing out."""
+        if ep.get("alive") is False:
+            return {"status": "FAILURE", "error": "disk not alive"}
+        target = (ep["ip"], int(ep["c_port"]))
+        conn = await self._disk_ep(target)
+        resp = await conn.request({"cmd": cmd, "args": args or {}}, next(self._ids),
+                                  timeout or self.block_timeout)
+        tracing.event("debug", "block." + cmd, target=target, stripe=(args or {}).get("stripe_idx"),
+                      disk=(args or {}).get("disk_index"), status=resp.get("status"), error=resp.get("error"))
+        return resp
+
+    async def _with_timeout(self, coro, timeout):
+        if timeout is None:
+            return await coro
+        return await asyncio.wait_for(coro, timeout)
+
+    async def read_block(self, ep, file_name, stripe_idx, disk_index, b, io_class=None):
+        """Fetch one logical b-byte block; None if the disk failed or the payload is unusable.
+        io_class picks the disk's scheduler queue; rebuilds pass "background"."""
+        args = {"file_name": file_name, "stripe_idx": stripe_idx, "disk_index": disk_index}
+        if io_class:
+            args["io_class"] = io_class
+        r = await self.disk_call(ep, "read-block", args)
+        if r.get("status") != "SUCCESS":
+            return None
+        try:
+            block = decode_block(r, b)
+        except Exception:
+            return None
+        return block if len(block) == b else None
+
+    # -- administrative commands ------------------------------------------
+
+    async def register(self, ip: str | None = None, c_port: int = 0) -> dict:
+        return check(await self.call("register-user", {
+            "user_name": self.user_name, "ip": ip or guess_my_ip(*self.mgr),
+            "m_port": self.m_port, "c_port": c_port}))
+
+    async def deregister(self) -> dict:
+        return check(await self.call("deregister-user", {"user_name": self.user_name}))
+
+    async def configure(self, dss_name: str, n: int, striping_unit: int, *, holes: bool = False,
+                        compress: str | None = None, compress_level: int = 1) -> dict:
+        """Create a DSS. holes stores all-zero blocks as flags without payload;
+        compress="zlib" deflates each block when that makes it smaller."""
+        return check(await self.call("configure-dss", {
+            "dss_name": dss_name, "n": n, "striping_unit": striping_unit,
+            "holes": holes, "compress": compress, "compress_level": compress_level}))
+
+    async def delete(self, dss_name: str, file_name: str) -> dict:
+        """Remove a file. Its blocks are reclaimed from the disks in the background."""
+        await self._release_leases([(dss_name, file_name)])
+        return check(await self.call_when_free("delete-file", {
+            "dss_name": dss_name, "file_name": file_name, "user_name": self.user_name}))
+
+    async def expand(self, dss_name: str, add: int = 1, *, rate_mbps: float | None = None) -> dict:
+        """Add `add` Free disks to a DSS. Existing files are restriped onto the new
+        width in the background (at most rate_mbps MB/s; None for the manager's
+        default), and ls reports the progress."""
+        return check(await self.call_when_free("expand-dss", {"dss_name": dss_name, "add": add, "rate_mbps": rate_mbps}))
+
+    async def ls(self) -> dict:
+        """The manager's listing, with each DSS's files fetched in full across pages."""
+        listing = check(await self.call_when_free("ls"))["listing"]
+        for dss in listing["dsses"]:
+            while dss.get("next") is not None:
+                page = check(await self.call_when_free("ls", {"dss_name": dss["dss_name"], "after": dss["next"]}))
+                more = page["listing"]["dsses"][0]
+                dss["files"].update(more["files"])
+                dss["next"] = more["next"]
+        return listing
+
+    # -- data path ------------------------------------------------------------
+
+    async def copy(self, dss_name: str, path: str | None = None, *, data: bytes | None = None,
+                   file_name: str | None = None, timeout: float | None = None) -> dict:
+        """Stripe a local file (or data=) onto a DSS and commit it with the manager."""
+        return await self._with_timeout(self._locked(self._copy(dss_name, path, data, file_name)), timeout)
+
+    async def _locked(self, coro):
+        """Run an operation that takes the manager's lock once this client's
+        previous one has released it."""
+        try:
+            async with self._op_lock:
+                return await coro
+        finally:
+            coro.close()  # not started if the wait for the lock was cancelled
+
+    async def _copy(self, dss_name, path, data, file_name):
+        if data is None:
+            data = await asyncio.to_thread(_read_file, path)
+        file_name = file_name or os.path.basename(path)
+        owner = self.user_name
+
+        with tracing.span("copy", dss=dss_name, file=file_name, size=len(data)):
+            with tracing.span("copy.prepare"):
+                prep = check(await self.call_when_free("copy-prepare", {
+                    "dss_name": dss_name, "file_name": file_name, "owner": owner}))
+            committed = False
+            obj = object_name(file_name)
+            try:
+                failed = await self._write_file(prep["dss"], obj, data)
+                warnings = [f"some write-block failed on stripe {i}" for i in sorted(failed)]
+
+                sha_src = hashlib.sha256(data).hexdigest()
+                with tracing.span("copy.complete"):
+                    done = await self.call("copy-complete", {
+                        "dss_name": dss_name, "file_name": file_name, "object": obj,
+                        "owner": owner, "size": len(data), "sha256": sha_src})
+                committed = True
+            finally:
+                if not committed:
+                    await self.call_answered("copy-abort", {"dss_name": dss_name, "owner": owner, "objects": [obj]})
+
+        await self._release_leases([(dss_name, file_name)])
+        check(done)
+        return {"file_name": file_name, "size": len(data), "sha256": sha_src,
+                "warnings": warnings, "complete": done}
+
+    def _stripe_pool(self):
+        if self._pool is None:
+            self._pool = stripepool.StripePool(self.encode_workers)
+        return self._pool
+
+    async def _write_file(self, d, file_name, data) -> dict:
+        """Stripe data onto the DSS described by d; return {stripe_idx: failed block count}."""
+        n = int(d["n"])
+        b = int(d["striping_unit"])
+        codec = d.get("codec")
+        stripes = total_stripes_for_size(len(data), n, b)
+        failed = {}
+        if self.encode_workers and len(data) > stripepool.TASK_BYTES:
+            # Workers encode later stripes while earlier ones are on the wire.
+            encoded = self._stripe_pool().encode_file(data, n, b, codec, stripes)
+            async with contextlib.aclosing(encoded) as it:
+                async for stripe_idx, fields in it:
+                    with tracing.span("copy.stripe", stripe=stripe_idx):
+                        bad = await self._write_stripe(d, file_name, stripe_idx, fields)
+                    if bad:
+                        failed[stripe_idx] = bad
+            return failed
+        for stripe_idx in range(stripes):
+            with tracing.span("copy.stripe", stripe=stripe_idx):
+                with tracing.span("copy.parity"):
+                    fields = [encode_block(blk, codec) for blk in encode_stripe(data, stripe_idx, n, b)]
+                bad = await self._write_stripe(d, file_name, stripe_idx, fields)
+            if bad:
+                failed[stripe_idx] = bad
+        return failed
+
+    async def _write_stripe(self, d, file_name, stripe_idx, fields) -> int:
+        """Write one encoded stripe (wire fields per disk); return how many blocks failed."""
+        n = int(d["n"])
+        p = parity_disk(n, stripe_idx)
+        with tracing.span("copy.io"):
+            results = await asyncio.gather(*(
+                self.disk_call(d["disks"][k], "write-block", {
+                    "dss_name": d["dss_name"],
+                    "file_name": file_name,
+                    "stripe_idx": stripe_idx,
+                    "disk_index": k,
+                    "is_parity": k == p,
+                    **fields[k],
+                })
+                for k in range(n)))
+        return sum(r.get("status") != "SUCCESS" for r in results)
+
+    async def copy_many(self, dss_name: str, paths: list[str], *, batch_size: int = 256,
+                        concurrency: int = 4, pack: bool = True, pack_threshold: int | None = None,
+                        timeout: float | None = None) -> dict:
+        """Copy many local files under one manager session.
+
+        Files stream through the same striping path as copy(), up to concurrency
+        at a time, and their metadata is committed in batches with a multi-file
+        copy-complete. With pack=True, files smaller than pack_threshold (default:
+        one stripe's data area) are appended to a shared pack object per batch and
+        recorded as (stripe, offset, length) extents instead of each being padded
+        out to a stripe of their own.
+
+        Returns {path: {"file_name", "status", "error"?}}. A file fails if it
+        cannot be read, if any stripe holding it lost more than one block (parity
+        can cover one), or if the manager rejects its entry.
+        """
+        return await self._with_timeout(
+            self._locked(self._copy_many(dss_name, paths, batch_size, concurrency, pack, pack_threshold)), timeout)
+
+    async def _copy_many(self, dss_name, paths, batch_size, concurrency, pack, pack_threshold):
+        owner = self.user_name
+        statuses = {}
+        batch = {"entries": [], "bytes": 0, "pack": bytearray()}
+        seen = set()
+        written = set()  # objects written and not yet handed to the manager, discarded on abort
+        dropped = []     # written objects that will never be committed: sent as garbage
+        sem = asyncio.Semaphore(concurrency)
+        batch_ids = itertools.count(1)
+
+        async def complete(args):
+            # Numbered, so the manager answers a resent batch without applying it again.
+            return await self.call_answered("copy-complete", {
+                "dss_name": dss_name, "owner": owner, "batch": next(batch_ids), **args})
+
+        async def flush(d, final):
+            nonlocal batch
+            cur, batch = batch, {"entries": [], "bytes": 0, "pack": bytearray()}
+            entries = cur["entries"]
+            packs = []
+            if cur["pack"]:
+                pack_name = f".pack-{owner}-{secrets.token_hex(8)}"
+                written.add(pack_name)
+                with tracing.span("copy-bulk.pack", pack=pack_name, size=len(cur["pack"])):
+                    failed = await self._write_file(d, pack_name, bytes(cur["pack"]))
+                lost = sorted(i for i, cnt in failed.items() if cnt > 1)
+                kept = []
+                for path, e in entries:
+                    if "extents" not in e:
+                        kept.append((path, e))
+                    elif lost:
+                        statuses[path] = {"file_name": e["file_name"], "status": "FAILURE",
+                                          "error": f"write-block failed on pack stripes {lost}"}
+                    else:
+                        kept.append((path, {**e, "pack": pack_name}))
+                entries = kept
+                if lost:
+                    written.discard(pack_name)
+                    dropped.append(pack_name)
+                else:
+                    packs.append({"pack": pack_name, "size": len(cur["pack"])})
+
+            # The manager takes ownership of everything in a successful copy-complete:
+            # committed files, packs (dropped again if nothing points into them),
+            # the objects of rejected entries and the discard list. Objects of files
+            # still being written by other tasks stay in written. The discard list
+            # is taken out of dropped before any await, so concurrent flushes never
+            # send the same names; more than a page of it goes ahead on its own.
+            gone, _ = take_page(dropped, DISCARD_PAGE_BYTES)
+            del dropped[:len(gone)]
+            while dropped:
+                r = await complete({"packs": [], "files": [], "discard": gone, "final": False})
+                if r.get("status") != "SUCCESS":
+                    break
+                gone, _ = take_page(dropped, DISCARD_PAGE_BYTES)
+                del dropped[:len(gone)]
+            objs = [e["object"] for _, e in entries if "object" in e] + [p["pack"] for p in packs]
+            with tracing.span("copy-bulk.complete", files=len(entries), final=final):
+                resp = await complete({"packs": packs, "files": [e for _, e in entries],
+                                       "discard": gone, "final": final})
+            if resp.get("status") != "SUCCESS":
+                for path, e in entries:
+                    statuses[path] = {"file_name": e["file_name"], "status": "FAILURE",
+                                      "error": resp.get("error", "unknown error")}
+                # Nothing was taken: none of it will be committed now, so it goes
+                # out as garbage with a later copy-complete or the abort.
+                written.difference_update(objs)
+                dropped.extend(gone + objs)
+                return resp
+            for (path, e), r in zip(entries, resp.get("results", [])):
+                statuses[path] = {**r, "file_name": e["file_name"]}
+            written.difference_update(objs)
+            return resp
+
+        async def one(d, path):
+            name = os.path.basename(path)
+            if name in seen:
+                statuses[path] = {"file_name": name, "status": "FAILURE", "error": "duplicate file name in batch"}
+                return
+            seen.add(name)
+            async with sem:
+                try:
+                    data = await asyncio.to_thread(_read_file, path)
+                except OSError as e:
+                    statuses[path] = {"file_name": name, "status": "FAILURE", "error": str(e)}
+                    return
+                entry = {"file_name": name, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+                stripe_data = (int(d["n"]) - 1) * int(d["striping_unit"])
+                # Empty files are never packed: they have no extents to locate them in the pack.
+                if pack and 0 < len(data) < (pack_threshold or stripe_data):
+                    # Appended without an await in between, so offsets stay consistent.
+                    entry["extents"] = pack_extents(len(batch["pack"]), len(data), stripe_data)
+                    batch["pack"] += data
+                else:
+                    entry["object"] = object_name(name)
+                    written.add(entry["object"])
+                    with tracing.span("copy-bulk.file", file=name, size=len(data)):
+                        failed = await self._write_file(d, entry["object"], data)
+                    lost = sorted(i for i, cnt in failed.items() if cnt > 1)
+                    if lost:
+                        written.discard(entry["object"])
+                        dropped.append(entry["object"])
+                        statuses[path] = {"file_name": name, "status": "FAILURE",
+                                          "error": f"write-block failed on stripes {lost}"}
+                        return
+                batch["entries"].append((path, entry))
+                batch["bytes"] += len(json.dumps(entry)) + 40
+                if len(batch["entries"]) >= batch_size or batch["bytes"] >= BULK_BATCH_BYTES:
+                    await flush(d, final=False)
+
+        with tracing.span("copy-bulk", dss=dss_name, files=len(paths)):
+            with tracing.span("copy-bulk.prepare"):
+                prep = check(await self.call_when_free("copy-prepare", {"dss_name": dss_name, "owner": owner, "bulk": True}))
+            committed = False
+            try:
+                await asyncio.gather(*(one(prep["dss"], p) for p in paths))
+                done = await flush(prep["dss"], final=True)
+                committed = done.get("status") == "SUCCESS"
+            finally:
+                if not committed:
+                    # Paged to fit a datagram; the final page releases the copy lock.
+                    objs = sorted(written) + dropped
+                    while True:
+                        page, _ = take_page(objs, DISCARD_PAGE_BYTES)
+                        objs = objs[len(page):]
+                        await self.call_answered("copy-abort", {"dss_name": dss_name, "owner": owner,
+                                                                "objects": page, "final": not objs})
+                        if not objs:
+                            break
+        await self._release_leases([(dss_name, st["file_name"]) for st in statuses.values()])
+        return statuses
+
+    async def read(self, dss_name: str, file_name: str, *, p_error: int = 0,
+                   timeout: float | None = None) -> dict:
+        """Read and parity-check a file. p_error (0..100) is the percent chance per
+        stripe attempt of flipping one bit, to exercise the verification path."""
+        return await self._with_timeout(self._read(dss_name, file_name, p_error), timeout)
+
+    async def _read(self, dss_name, file_name, p_error):
+        with tracing.span("read", dss=dss_name, file=file_name) as sp:
+            lease = self._lease(dss_name, file_name)
+            if lease:
+                # Optimistic: a stale cache shows up as missing blocks or a checksum
+                # mismatch, and then the read is redone under a fresh read-prepare.
+                sp.set(lease=lease["id"])
+                try:
+                    res = await self._read_prepared(dss_name, file_name, lease["prep"], p_error, False)
+                    if res["match"] is not False:
+                        return res
+                except DSSError:
+                    pass
+                await self._release_leases([(dss_name, file_name)])
+            with tracing.span("read.prepare"):
+                prep = check(await self.call_when_free("read-prepare", {
+                    "dss_name": dss_name, "file_name": file_name, "user_name": self.user_name,
+                    "lease": self.leases}))
+            if prep.get("lease"):
+                await self._keep_lease(dss_name, file_name, prep)
+            return await self._read_prepared(dss_name, file_name, prep, p_error, not prep.get("lease"))
+
+    async def _read_prepared(self, dss_name, file_name, prep, p_error, complete):
+        """Read a file with the layout from read-prepare. complete sends read-complete
+        afterwards; leased reads are covered by their lease instead."""
+        try:
+            n = int(prep["dss"]["n"])
+            b = int(prep["dss"]["striping_unit"])
+            disks = prep["dss"]["disks"]
+            file_size = int(prep["file"]["size"])
+            pack = prep["file"].get("pack")
+
+            data_blocks = []
+            if pack:
+                # Packed small file: only the pack stripes holding its extents are read.
+                for stripe_idx, off, length in prep["file"]["extents"]:
+                    with tracing.span("read.stripe", pack=pack, stripe=stripe_idx):
+                        got = await self._read_stripe(disks, pack, stripe_idx, n, b, p_error)
+                    area = b"".join(got[i] for i in data_disk_order(n, stripe_idx))
+                    data_blocks.append(area[off:off + length])
+            else:
+                obj = prep["file"].get("object") or file_name
+                for stripe_idx in range(total_stripes_for_size(file_size, n, b)):
+                    with tracing.span("read.stripe", stripe=stripe_idx):
+                        got = await self._read_stripe(disks, obj, stripe_idx, n, b, p_error)
+                    data_blocks.extend(got[i] for i in data_disk_order(n, stripe_idx))
+        finally:
+            if complete:
+                with tracing.span("read.complete"):
+                    await self.call("read-complete", {"dss_name": dss_name, "epoch": prep.get("epoch")})
+
+        buf = b"".join(data_blocks)[:file_size]
+        sha_read = hashlib.sha256(buf).hexdigest()
+        sha_expected = prep.get("file", {}).get("sha256")
+        return {"data": buf, "size": len(buf), "sha256": sha_read, "expected_sha256": sha_expected,
+                "match": (sha_read == sha_expected) if sha_expected else None}
+
+    # -- read leases --------------------------------------------------------
+
+    def _lease(self, dss_name, file_name):
+        lease = self._leases.get((dss_name, file_name))
+        if lease and time.monotonic() >= lease["expires"]:
+            del self._leases[(dss_name, file_name)]
+            return None
+        return lease
+
+    async def _keep_lease(self, dss_name, file_name, prep):
+        lease = prep["lease"]
+        # Counted from receipt, minus a margin, so the cache never outlives the
+        # manager's view of the lease.
+        expires = time.monotonic() + float(lease["ttl"]) * (1 - LEASE_MARGIN)
+        # A newer DSS version means files may have moved or changed since older leases.
+        stale = [k for k, v in self._leases.items()
+                 if k[0] == dss_name and (v["version"] < lease["version"] or k[1] == file_name)]
+        # Swap the cache entry before awaiting anything, so concurrent reads of the
+        # same file each release the lease they replace instead of dropping one.
+        ids = [self._leases.pop(k)["id"] for k in stale]
+        self._leases[(dss_name, file_name)] = {"id": lease["id"], "version": lease["version"],
+                                               "expires": expires, "prep": prep}
+        if ids:
+            await self.call("lease-release", {"lease_ids": ids})
+
+    async def _release_leases(self, keys=None, dss_name=None):
+        """Forget cached leases (the given keys, all of one DSS, or all) and let the
+        manager drop them so they stop counting as reads in progress."""
+        if keys is None:
+            keys = [k for k in self._leases if dss_name is None or k[0] == dss_name]
+        ids = [self._leases.pop(k)["id"] for k in keys if k in self._leases]
+        if ids and self._mgr_ep:
+            await self.call("lease-release", {"lease_ids": ids})
+
+    async def _read_stripe(self, disks, file_name, stripe_idx, n, b, p_error):
+        """All n blocks of a stripe, reconstructing at most one, parity-verified."""
+        pidx = parity_disk(n, stripe_idx)
+        for attempt in range(MAX_RETRIES):
+            last = attempt == MAX_RETRIES - 1
+            with tracing.span("read.io", attempt=attempt):
+                got = list(await asyncio.gather(*(
+                    self.read_block(disks[k], file_name, stripe_idx, k, b) for k in range(n))))
+
+            if p_error > 0 and random.randrange(100) < p_error:
+                flip_idx = random.randrange(n)
+                if got[flip_idx]:
+                    bb = bytearray(got[flip_idx])
+                    bb[random.randrange(len(bb))] ^= (1 << random.randrange(8))
+                    got[flip_idx] = bytes(bb)
+
+            with tracing.span("read.parity", attempt=attempt):
+                missing = [i for i in range(n) if got[i] is None]
+                if len(missing) > 1:
+                    if last:
+                        raise DSSError(f"read failed at stripe {stripe_idx}: multiple blocks missing after retries")
+                    continue
+                if len(missing) == 1:
+                    miss = missing[0]
+                    got[miss] = xor_bytes([got[i] for i in range(n) if i != miss], b)
+
+                calc_parity = xor_bytes([got[i] for i in range(n) if i != pidx], b)
+                if calc_parity != got[pidx]:
+                    if last:
+                        raise DSSError(f"read failed parity at stripe {stripe_idx} after {MAX_RETRIES} attempts")
+                    continue
+            return got
+
+    async def disk_failure(self, dss_name: str, *, failed_index: int | None = None,
+                           on_fail=None, peer: bool = False, on_progress=None,
+                           timeout: float | None = None) -> dict:
+        """Fail one disk of the DSS (random unless failed_index is given) and rebuild
+        it from the survivors. on_fail(index, disk_name) is called once it has failed.
+
+        With peer=True the failed disk pulls the surviving blocks from its peers
+        itself and reports progress to the manager; this client only polls
+        rebuild-status (calling on_progress(done, total)), and the rebuild
+        carries on if it goes away."""
+        return await self._with_timeout(
+            self._locked(self._disk_failure(dss_name, failed_index, on_fail, peer, on_progress)), timeout)
+
+    async def _disk_failure(self, dss_name, failed_idx, on_fail, peer, on_progress):
+        await self._release_leases(dss_name=dss_name)  # our own leases would block it
+        with tracing.span("rebuild", dss=dss_name):
+            with tracing.span("rebuild.prepare"):
+                prep = check(await self.call_when_free("disk-failure", {"dss_name": dss_name, "user_name": self.user_name}))
+            handed_off = False
+            try:
+                d = prep["dss"]
+                n = int(d["n"])
+                b = int(d["striping_unit"])
+                disks = d["disks"]
+
+                if failed_idx is None:
+                    failed_idx = random.randrange(n)  # the manager refuses while any disk is down
+                failed_ep = disks[failed_idx]
+                check_fail = await self.disk_call(failed_ep, "fail")
+                if check_fail.get("status") != "SUCCESS":
+                    raise DSSError("disk did not confirm failure", check_fail)
+                if on_fail:
+                    on_fail(failed_idx, failed_ep["disk_name"])
+
+                if peer:
+                    r = await self.call("peer-rebuild", {"dss_name": dss_name, "failed_index": failed_idx})
+                    if r.get("status") != "SUCCESS":
+                        await self.disk_call(failed_ep, "set-mode", {"state": "normal"})
+                    check(r)
+                    handed_off = True
+                    done = await self._wait_peer_rebuild(dss_name, on_progress)
+                    return {"failed_index": failed_idx, "disk_name": failed_ep["disk_name"], "complete": done}
+
+                # Objects not yet restriped after an expansion are narrower than the
+                # DSS; their layout is a prefix of the current one.
+                objects = [(obj, int(size), int(width)) for obj, size, width in prep["objects"]]
+                nxt = prep.get("objects_next")
+                while nxt is not None:
+                    r = check(await self.call("rebuild-objects", {"dss_name": dss_name, "offset": nxt}))
+                    objects += [(obj, int(size), int(width)) for obj, size, width in r["objects"]]
+                    nxt = r.get("objects_next")
+                try:
+                    for obj, size, width in objects:
+                        if failed_idx >= width:
+                            continue
+                        layout = dict(d, n=width, disks=disks[:width])
+                        stripes = total_stripes_for_size(size, width, b)
+                        if self.encode_workers:
+                            await self._rebuild_pooled(layout, obj, stripes, failed_idx)
+                            continue
+                        for stripe_idx in range(stripes):
+                            with tracing.span("rebuild.stripe", file=obj, stripe=stripe_idx):
+                                await self._rebuild_stripe(layout, obj, stripe_idx, failed_idx)
+                finally:
+                    await self.disk_call(failed_ep, "set-mode", {"state": "normal"})
+            finally:
+                # A peer rebuild ends the operation on the manager when the disk reports in.
+                if not handed_off:
+                    with tracing.span("rebuild.complete"):
+                        done = await self.call("recovery-complete", {"dss_name": dss_name})
+
+        check(done)
+        return {"failed_index": failed_idx, "disk_name": failed_ep["disk_name"], "complete": done}
+
+    async def _wait_peer_rebuild(self, dss_name, on_progress):
+        poll = 0.01
+        with tracing.span("rebuild.peer-wait"):
+            while True:
+                await asyncio.sleep(poll)
+                poll = min(poll * 2, PEER_POLL)
+                r = await self.call("rebuild-status", {"dss_name": dss_name})
+                if r.get("status") != "SUCCESS":
+                    continue  # lost datagram or the manager is busy; ask again
+                job = r["rebuild"]
+                if on_progress and job.get("total") is not None:
+                    on_progress(job["done"], job["total"])
+                if job["state"] == "done":
+                    return r
+                if job["state"] != "running":
+                    raise DSSError(f"peer rebuild {job['state']}: {job.get('error') or str(job.get('failed')) + ' stripes failed'}", r)
+
+    async def _rebuild_stripe(self, d, fname, stripe_idx, failed_idx):
+        n = int(d["n"])
+        b = int(d["striping_unit"])
+        disks = d["disks"]
+        others = [k for k in range(n) if k != failed_idx]
+        with tracing.span("rebuild.io"):
+            got = await asyncio.gather(*(self.read_block(disks[k], fname, stripe_idx, k, b, "background") for k in others))
+        missing_other = [k for k, blk in zip(others, got) if blk is None]
+        if missing_other:
+            raise DSSError(f"reconstruct failed at stripe {stripe_idx} for file {fname}: missing from {missing_other}")
+
+        with tracing.span("rebuild.parity"):
+            rebuilt = xor_bytes(got, b)
+        with tracing.span("rebuild.write"):
+            wr = await self.disk_call(disks[failed_idx], "write-block", {
+                "dss_name": d["dss_name"],
+                "file_name": fname,
+                "stripe_idx": stripe_idx,
+                "disk_index": failed_idx,
+                "is_parity": failed_idx == parity_disk(n, stripe_idx),
+                "io_class": "background",
+                **encode_block(rebuilt, d.get("codec")),
+            })
+        if wr.get("status") != "SUCCESS":
+            raise DSSError(f"write failed during reconstruction at stripe {stripe_idx} for file {fname}: {wr}")
+
+    async def _rebuild_pooled(self, d, fname, stripes, failed_idx):
+        """Rebuild one object a window of stripes at a time: read the window's
+        surviving blocks together, XOR and encode them on the worker pool, then
+        write the rebuilt blocks. Windows are sized like the disks' peer rebuild
+        so one burst of blocks stays inside a socket buffer."""
+        n = int(d["n"])
+        b = int(d["striping_unit"])
+        disks = d["disks"]
+        others = [k for k in range(n) if k != failed_idx]
+        step = blockio.window_size(b, n - 1, budget=128 * 1024)
+        for first in range(0, stripes, step):
+            window = range(first, min(stripes, first + step))
+            with tracing.span("rebuild.window", file=fname, stripe=first, stripes=len(window)):
+                with tracing.span("rebuild.io"):
+                    got = await asyncio.gather(*(
+                        asyncio.gather(*(self.read_block(disks[k], fname, s, k, b, "background") for k in others))
+                        for s in window))
+                for s, blocks in zip(window, got):
+                    missing_other = [k for k, blk in zip(others, blocks) if blk is None]
+                    if missing_other:
+                        raise DSSError(f"reconstruct failed at stripe {s} for file {fname}: missing from {missing_other}")
+                with tracing.span("rebuild.parity"):
+                    fields = await self._stripe_pool().rebuild_blocks(got, b, d.get("codec"))
+                with tracing.span("rebuild.write"):
+                    wrs = await asyncio.gather(*(
+                        self.disk_call(disks[failed_idx], "write-block", {
+                            "dss_name": d["dss_name"],
+                            "file_name": fname,
+                            "stripe_idx": s,
+                            "disk_index": failed_idx,
+                            "is_parity": failed_idx == parity_disk(n, s),
+                            "io_class": "background",
+                            **f,
+                        })
+                        for s, f in zip(window, fields)))
+            for s, wr in zip(window, wrs):
+                if wr.get("status") != "SUCCESS":
+                    raise DSSError(f"write failed during reconstruction at stripe {s} for file {fname}: {wr}")
+
+    async def decommission(self, dss_name: str, *, timeout: float | None = None) -> dict:
+        """Wipe every disk of the DSS and return them to the free pool."""
+        return await self._with_timeout(self._locked(self._decommission(dss_name)), timeout)
+
+    async def _decommission(self, dss_name):
+        await self._release_leases(dss_name=dss_name)
+        prep = check(await self.call_when_free("decommission-dss", {"dss_name": dss_name, "user_name": self.user_name}))
+        try:
+            disks = prep["dss"]["disks"]
+            results = await asyncio.gather(*(self.disk_call(ep, "wipe") for ep in disks))
+            failures = [(ep["disk_name"], r) for ep, r in zip(disks, results) if r.get("status") != "SUCCESS"]
+        finally:
+            done = await self.call("decommission-complete", {"dss_name": dss_name})
+        check(done)
+        return {"wipe_failures": failures, "complete": done}
+
+def object_name(file_name: str) -> str:
+    """A fresh name to store one copy of file_name under. Copies never reuse an
+    object, so the blocks of a replaced or deleted copy can be reclaimed lazily."""
+    return f"{file_name}@{secrets.token_hex(4)}"
+
+def expand_paths(spec: str) -> list[str]:
+    """Regular files in a directory (non-recursive), or matching a glob pattern."""
+    if os.path.isdir(spec):
+        paths = [os.path.join(spec, name) for name in os.listdir(spec)]
+    else:
+        paths = glob.glob(spec)
+    return sorted(p for p in paths if os.path.isfile(p))
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -1,5 +1,13 @@
-import socket, json, argparse, time
-import threading, base64
+import socket, json, argparse, time, os
+import threading, base64, itertools, collections
+import stats as statslib
+import tracing
+import blockio, iosched
+from striping import (total_stripes_for_size, xor_bytes, pack_block, decode_block, b64d,
+                      data_disk_order, parity_disk, stripe_blocks, encode_block)
+
+PEER_RETRIES = 3
+PROGRESS_INTERVAL = 0.5  # seconds between rebuild-progress and restripe-progress reports
 
 def guess_my_ip(to_ip: str, to_port: int) -> str:
     """Derive outward-facing local IP by opening a UDP 'connect' to manager."""
@@ -11,14 +19,109 @@ def guess_my_ip(to_ip: str, to_port: int) -> str:
         s.close()
     return ip
 
+def read_object(sock, ids, eps, obj, size, n, b, timeout):
+    """Yield the contents of an object striped n wide one window of stripes at a
+    time, reconstructing at most one block per stripe and checking parity
+    otherwise. Yields None and stops if a stripe is unreadable."""
+    stripes = total_stripes_for_size(size, n, b)
+    per = blockio.window_size(b, n)
+    for s0 in range(0, stripes, per):
+        window = range(s0, min(stripes, s0 + per))
+        out = bytearray()
+        got = blockio.batch_call(sock, ids, [
+            (eps[k], "read-block", {"file_name": obj, "stripe_idx": s, "disk_index": k, "io_class": "background"})
+            for s in window for k in range(n)], timeout, PEER_RETRIES)
+        for j, s in enumerate(window):
+            try:
+                blocks = [decode_block(r, b) if r else None for r in got[j * n:(j + 1) * n]]
+            except Exception:
+                yield None
+                return
+            missing = [k for k in range(n) if blocks[k] is None or len(blocks[k]) != b]
+            if len(missing) > 1:
+                yield None
+                return
+            if missing:
+                blocks[missing[0]] = xor_bytes([blk for k, blk in enumerate(blocks) if k != missing[0]], b)
+            elif any(xor_bytes(blocks, b)):
+                yield None
+                return
+            out += b"".join(blocks[k] for k in data_disk_order(n, s))
+        yield bytes(out[:max(0, size - s0 * (n - 1) * b)])
+
+def write_object(sock, ids, eps, dss_name, obj, chunks, n, b, codec, timeout, pace=None) -> bool:
+    """Stripe the byte chunks (None marks a failed read) onto n disks as obj, a
+    batch of whole stripes at a time, so only a batch or so is ever buffered.
+    pace(nbytes) is called after each batch."""
+    # Writes carry the payload, so batches are kept small enough for the disks' buffers.
+    per = blockio.window_size(b, n, budget=128 * 1024)
+    stripe_data = (n - 1) * b
+    buf, s0 = bytearray(), 0
+
+    def write_batch(count):
+        nonlocal s0
+        reqs = []
+        for j in range(count):
+            s = s0 + j
+            p = parity_disk(n, s)
+            area = buf[j * stripe_data:(j + 1) * stripe_data]
+            reqs.extend((eps[k], "write-block", {"dss_name": dss_name, "file_name": obj, "stripe_idx": s,
+                                                 "disk_index": k, "is_parity": k == p, "io_class": "background",
+                                                 **encode_block(blk, codec)})
+                        for k, blk in enumerate(stripe_blocks(area, s, n, b)))
+        if any(r is None for r in blockio.batch_call(sock, ids, reqs, timeout, PEER_RETRIES)):
+            return False
+        moved = min(len(buf), count * stripe_data)
+        del buf[:count * stripe_data]
+        s0 += count
+        if pace:
+            pace(moved)
+        return True
+
+    for chunk in chunks:
+        if chunk is None:
+            return False
+        buf += chunk
+        while len(buf) >= per * stripe_data:
+            if not write_batch(per):
+                return False
+    while buf:
+        if not write_batch(min(per, -(-len(buf) // stripe_data))):
+            return False
+    return True
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("disk_name")
     ap.add_argument("manager_ip")
     ap.add_argument("manager_port", type=int)
     ap.add_argument("my_m_port", type=int)   # this process' UDP port
-    ap.add_argument("my_c_port", type=int)   # reserved for future peer traffic
+    ap.add_argument("my_c_port", type=int)   # block traffic from users and peer disks
+    ap.add_argument("--no-stats", action="store_true", help="disable per-command instrumentation")
+    ap.add_argument("--stats-file", help="periodically write Prometheus text metrics here")
+    ap.add_argument("--stats-interval", type=float, default=10.0)
+    ap.add_argument("--heartbeat-interval", type=float, default=2.0,
+                    help="seconds between load reports to the manager (0 disables)")
+    ap.add_argument("--peer-timeout", type=float, default=1.0,
+                    help="seconds to wait for peer blocks during a peer rebuild")
+    ap.add_argument("--io-workers", type=int, default=2,
+                    help="threads serving queued read-block/write-block requests")
+    ap.add_argument("--io-weights", default="",
+                    help="fair-share weight per I/O class, e.g. read=8,write=4,background=1")
+    ap.add_argument("--io-caps", default="",
+                    help="most requests of a class served at once, e.g. read=2,write=2,background=1")
+    ap.add_argument("--trace-dir", default=".",
+                    help="directory remote trace-dump requests write into")
+    tracing.add_args(ap)
     args = ap.parse_args()
+    tracing.configure_from_args(args)
+    try:
+        weights = iosched.parse_classes(args.io_weights, iosched.DEFAULT_WEIGHTS)
+        caps = iosched.parse_classes(args.io_caps, iosched.DEFAULT_CAPS)
+    except ValueError as e:
+        ap.error(str(e))
+    if args.io_workers < 1:
+        ap.error("--io-workers must be at least 1")
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind(("0.0.0.0", args.my_m_port))
@@ -29,104 +132,418 @@ def main():
     msg = {
         "cmd": "register-disk",
         "args": {"disk_name": args.disk_name, "ip": my_ip,
-                 "m_port": args.my_m_port, "c_port": args.my_c_port}
+                 "m_port": args.my_m_port, "c_port": args.my_c_port,
+                 "heartbeat_interval": args.heartbeat_interval}
     }
-    print({"trace": "send", "to": (args.manager_ip, args.manager_port), "msg": msg})
+    tracing.event("info", "send", to=(args.manager_ip, args.manager_port), msg=msg)
     sock.sendto(json.dumps(msg).encode(), (args.manager_ip, args.manager_port))
 
     # Wait for reply
     data, _ = sock.recvfrom(12000)
     resp = json.loads(data.decode("utf-8"))
-    print({"trace": "recv", "from": "manager", "resp": resp})
+    tracing.event("info", "recv", frm="manager", resp=resp)
 
     c_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     c_sock.bind(("0.0.0.0", args.my_c_port))
 
-    # in the memory make sure to store: (file_name, stripe_idx, disk_index) in bytes
+    # in the memory make sure to store: (file_name, stripe_idx, disk_index) -> (enc, payload)
+    # enc is None for raw bytes, "zlib" for a deflated block, "hole" for an all-zero block (no payload)
     store = {}
+    # Secondary index: file_name -> {(stripe_idx, disk_index)}, so deleting an
+    # object costs O(its blocks) instead of a scan of the whole store.
+    objects = {}
     mode = {"state": "normal"}
+    # Running totals for heartbeats, kept even when stats are disabled.
+    load = {"stored_bytes": 0, "requests": 0, "latency_ns": 0}
 
-    def content_loop():
+    stats = statslib.new_stats(enabled=not args.no_stats)
+    stats_lock = threading.Lock()
+    # Block I/O is served by several io_worker threads alongside a peer rebuild,
+    # so changes to the store and its totals go under one lock.
+    store_lock = threading.Lock()
+    sched = iosched.IOScheduler(weights, caps)
+    if args.stats_file:
+        statslib.start_dumper(stats, args.stats_file, "dss_disk", {"disk": args.disk_name},
+                              interval=args.stats_interval)
+
+    def put_block(key, enc, payload):
+        with store_lock:
+            old = store.get(key)
+            if old is not None:
+                load["stored_bytes"] -= len(old[1])
+            else:
+                objects.setdefault(key[0], set()).add(key[1:])
+            store[key] = (enc, payload)
+            load["stored_bytes"] += len(payload)
+
+    def delete_object(name) -> int:
+        with store_lock:
+            blocks = objects.pop(name, ())
+            for rest in blocks:
+                enc, payload = store.pop((name,) + rest)
+                load["stored_bytes"] -= len(payload)
+            return len(blocks)
+
+    def clear_store():
+        with store_lock:
+            store.clear()
+            objects.clear()
+            load["stored_bytes"] = 0
+
+    def heartbeat_loop():
+        """Report stored bytes, request rate and mean latency since the last beat."""
+        prev = (time.monotonic(), 0, 0)
         while True:
-            data2, addr2 = c_sock.recvfrom(65535)
+            time.sleep(args.heartbeat_interval)
+            now, reqs, lat = time.monotonic(), load["requests"], load["latency_ns"]
+            d_reqs = reqs - prev[1]
+            beat = {"cmd": "heartbeat", "args": {
+                "disk_name": args.disk_name,
+                "stored_bytes": load["stored_bytes"],
+                "blocks": len(store),
+                "req_rate": round(d_reqs / max(now - prev[0], 1e-9), 3),
+                "latency_ms": round((lat - prev[2]) / d_reqs / 1e6, 4) if d_reqs else 0.0,
+                "mode": mode["state"],
+            }}
+            prev = (now, reqs, lat)
+            send_manager(beat)
+
+    def send_manager(msg):
+        try:
+            sock.sendto(json.dumps(msg).encode(), (args.manager_ip, args.manager_port))
+        except OSError as e:
+            tracing.event("error", "send-failed", cmd=msg.get("cmd"), error=repr(e))
+
+    def peer_rebuild(job):
+        """Rebuild this disk's blocks of every object by pulling the other blocks
+        of each stripe from the peers and XORing them locally. Objects carry the
+        width they are striped at; this disk's index is the same in every width."""
+        d = job["dss"]
+        b, me = int(d["striping_unit"]), int(job["disk_index"])
+        codec = d.get("codec")
+        stripes = []
+        for obj in job["objects"]:
+            name, size, n = obj[0], int(obj[1]), int(obj[2]) if len(obj) > 2 else int(d["n"])
+            if me < n:
+                stripes.extend((name, s, n) for s in range(total_stripes_for_size(size, n, b)))
+        report = {"job": job["job"], "dss_name": d["dss_name"], "disk_name": args.disk_name,
+                  "total": len(stripes), "done": 0, "failed": 0, "state": "running"}
+        send_manager({"cmd": "rebuild-progress", "args": dict(report)})
+        last = time.monotonic()
+
+        peer_sock = blockio.open_socket()
+        ids = itertools.count(1)
+        per_window = blockio.window_size(b, len(d["disks"]) - 1)
+        try:
+            with tracing.span("peer-rebuild", dss=d["dss_name"], stripes=len(stripes)):
+                for w in range(0, len(stripes), per_window):
+                    window = stripes[w:w + per_window]
+                    reqs = []
+                    for name, s, n in window:
+                        reqs.extend(((d["disks"][k]["ip"], int(d["disks"][k]["c_port"])), "read-block",
+                                     {"file_name": name, "stripe_idx": s, "disk_index": k,
+                                      "io_class": "background"})
+                                    for k in range(n) if k != me)
+                    got = blockio.batch_call(peer_sock, ids, reqs, args.peer_timeout, PEER_RETRIES)
+                    pos = 0
+                    for name, s, n in window:
+                        replies, pos = got[pos:pos + n - 1], pos + n - 1
+                        try:
+                            blocks = [decode_block(r, b) for r in replies]
+                        except Exception:
+                            blocks = None
+                        if not blocks or any(len(blk) != b for blk in blocks):
+                            report["failed"] += 1
+                            tracing.event("error", "peer-rebuild-stripe-failed", file=name, stripe=s,
+                                          missing=[k for k, r in zip((k for k in range(n) if k != me), replies)
+                                                   if r is None])
+                            continue
+                        put_block((name, s, me), *pack_block(xor_bytes(blocks, b), codec))
+                    report["done"] += len(window)
+                    if time.monotonic() - last >= PROGRESS_INTERVAL:
+                        send_manager({"cmd": "rebuild-progress", "args": dict(report)})
+                        last = time.monotonic()
+            report["state"] = "done" if not report["failed"] else "failed"
+        except Exception as e:
+            report["state"] = "failed"
+            report["error"] = repr(e)
+        finally:
+            peer_sock.close()
+            mode["state"] = "normal"
+            jobs["running"]["rebuild"] = None
+            send_manager({"cmd": "rebuild-progress", "args": report})
+
+    def restripe(job):
+        """Copy each object of a restripe job to the full width of the DSS under a
+        new object name, reading the old copy from the peers (and this disk).
+        Every switch is sent to the manager as restripe-commit, so metadata still
+        only changes there and reads keep using the old copy until then. Commits
+        are requests resent until the manager answers, for up to job["timeout"]:
+        the time after which the manager fails a job it has not heard from, so a
+        commit still unanswered by then has nothing left to commit to. job["rate"]
+        caps the bytes moved per second (0 for no cap), held per batch of stripes."""
+        d = job["dss"]
+        b, n, codec = int(d["striping_unit"]), int(d["n"]), d.get("codec")
+        eps = [(e["ip"], int(e["c_port"])) for e in d["disks"]]
+        rate = float(job.get("rate") or 0)
+        report = {"job": job["job"], "dss_name": d["dss_name"], "disk_name": args.disk_name, "state": "running"}
+        send_manager({"cmd": "restripe-progress", "args": report})
+        t0, moved, last = time.monotonic(), 0, time.monotonic()
+
+        def pace(nbytes):
+            nonlocal moved, last
+            moved += nbytes
+            while True:
+                if time.monotonic() - last >= PROGRESS_INTERVAL:
+                    send_manager({"cmd": "restripe-progress", "args": dict(report, moved=moved)})
+                    last = time.monotonic()
+                ahead = moved / rate - (time.monotonic() - t0) if rate > 0 else 0
+                if ahead <= 0:
+                    return
+                time.sleep(min(ahead, PROGRESS_INTERVAL))
+
+        block_sock = blockio.open_socket()
+        ids = itertools.count(1)
+
+        def commit(**fields):
+            return blockio.call_until(block_sock, ids, (args.manager_ip, args.manager_port), "restripe-commit",
+                                      {"job": job["job"], "dss_name": d["dss_name"], **fields},
+                                      args.peer_timeout, time.monotonic() + float(job.get("timeout") or 30.0))
+
+        error = None
+        try:
+            with tracing.span("restripe", dss=d["dss_name"], objects=len(job["objects"])):
+                for seq, (kind, name, obj, size, old_n) in enumerate(job["objects"]):
+                    new_obj = f"{name}@{job['token']}"
+                    chunks = read_object(block_sock, ids, eps, obj, int(size), int(old_n), b, args.peer_timeout)
+                    ok = write_object(block_sock, ids, eps, d["dss_name"], new_obj, chunks, n, b, codec,
+                                      args.peer_timeout, pace)
+                    r = commit(seq=seq, kind=kind, name=name, old_object=obj, object=new_obj, n=n,
+                               bytes=size, failed=not ok)
+                    if r is None or r.get("status") != "SUCCESS" or r.get("state") != "running":
+                        error = "commit not answered" if r is None else f"commit not accepted: {r.get('error') or r.get('state')}"
+                        return
+        except Exception as e:
+            error = repr(e)
+        finally:
+            if error:
+                tracing.event("error", "restripe-failed", dss=d["dss_name"], error=error)
+            commit(final=True, error=error)
+            block_sock.close()
+            jobs["running"]["restripe"] = None
+
+    # Jobs pushed by the manager, at most one of each kind at a time.
+    jobs = {"running": {"rebuild": None, "restripe": None}, "parts": {}, "started": collections.deque(maxlen=16)}
+    job_targets = {"rebuild": peer_rebuild, "restripe": restripe}
+
+    def take_job(msg):
+        """File one job datagram from the manager; start the job once all its parts are in."""
+        kind = msg.get("cmd") if isinstance(msg, dict) else None
+        if kind not in job_targets:
+            return
+        # A job can span several datagrams; its object list arrives in parts.
+        # The manager resends every part until the first progress report, so
+        # copies of a job already started (or already assembled) are dropped.
+        a = msg.get("args")
+        if not isinstance(a, dict):
+            tracing.event("error", "bad-job", cmd=kind, error="args must be an object")
+            return
+        job_id = a.get("job")
+        if a.get("token") is not None and a.get("token") in jobs["started"]:
+            return
+        if jobs["running"][kind] is not None:
+            send_manager({"cmd": kind + "-progress", "args": {
+                "job": job_id, "dss_name": (a.get("dss") or {}).get("dss_name"),
+                "disk_name": args.disk_name, "state": "failed", "error": kind + " already running"}})
+            return
+        parts = jobs["parts"].setdefault(job_id, {})
+        parts[a.get("part", len(parts))] = a.get("objects") or []
+        if len(parts) == a.get("parts", len(parts) if a.get("final") else -1):
+            del jobs["parts"][job_id]
+            job = dict(a, objects=[obj for i in sorted(parts) for obj in parts[i]])
+            jobs["running"][kind] = job_id
+            jobs["started"].append(a.get("token"))
+            threading.Thread(target=tracing.bind(job_targets[kind]), args=(job,), daemon=True).start()
+
+    def manager_loop():
+        """Commands pushed by the manager to this disk's manager port."""
+        while True:
+            data, _ = sock.recvfrom(65535)
+            # A malformed datagram must not end the only thread taking jobs.
             try:
-                msg2 = json.loads(data2.decode("utf-8"))
-            except Exception:
-                c_sock.sendto(json.dumps({"status": "FAILURE", "error": "bad json"}).encode(), addr2)
-                continue
+                take_job(json.loads(data.decode("utf-8")))
+            except Exception as e:
+                tracing.event("error", "bad-job", error=repr(e))
 
-            if msg2.get("cmd") == "write-block":
-                a2 = msg2.get("args", {})
-                file_name  = a2.get("file_name")
-                stripe_idx = a2.get("stripe_idx")
-                disk_index = a2.get("disk_index")
-                block_b64  = a2.get("block_b64")
+    def handle(msg2):
+        """Serve one decoded content-port request; returns (cmd, reply)."""
+        cmd2 = msg2.get("cmd") if msg2 else "bad-json"
+        if msg2 is None:
+            resp2 = {"status": "FAILURE", "error": "bad json"}
+        elif cmd2 == "write-block":
+            a2 = msg2.get("args", {})
+            file_name  = a2.get("file_name")
+            stripe_idx = a2.get("stripe_idx")
+            disk_index = a2.get("disk_index")
+            block_b64  = a2.get("block_b64")
+            enc        = a2.get("enc")
 
-                ok = True
+            ok = True
+            try:
+                stripe_idx = int(stripe_idx)
+                disk_index = int(disk_index)
+            except Exception:
+                ok = False
+
+            if not (ok and file_name and enc in (None, "zlib", "hole")
+                    and (enc == "hole" or isinstance(block_b64, str))):
+                resp2 = {"status": "FAILURE", "error": "missing/invalid fields"}
+            elif enc == "hole":
+                put_block((file_name, stripe_idx, disk_index), "hole", b"")
+                resp2 = {"status": "SUCCESS"}
+            else:
                 try:
-                    stripe_idx = int(stripe_idx)
-                    disk_index = int(disk_index)
-                except Exception:
-                    ok = False
+                    block = b64d(block_b64)  # straight from the decoded JSON str, no ASCII copy
+                    put_block((file_name, stripe_idx, disk_index), enc, block)
+                    resp2 = {"status": "SUCCESS"}
+                except Exception as e:
+                    resp2 = {"status": "FAILURE", "error": f"decode error: {e}"}
+
+        elif cmd2 == "read-block":
+            a2 = msg2.get("args", {})
+            file_name  = a2.get("file_name")
+            stripe_idx = a2.get("stripe_idx")
+            disk_index = a2.get("disk_index")
 
-                if not (ok and file_name and isinstance(block_b64, str)):
-                    resp2 = {"status": "FAILURE", "error": "missing/invalid fields"}
+            ok = True
+            try:
+                stripe_idx = int(stripe_idx)
+                disk_index = int(disk_index)
+            except Exception:
+                ok = False
+
+            found = store.get((file_name, stripe_idx, disk_index)) if ok and file_name else None
+            if mode["state"] == "fail":
+                resp2 = {"status": "FAILURE", "error": "simulated failure"}
+            elif found is None:
+                resp2 = {"status": "FAILURE", "error": "not found"}
+            else:
+                enc, block = found
+                if enc == "hole":
+                    resp2 = {"status": "SUCCESS", "enc": "hole"}
                 else:
-                    try:
-                        block = base64.b64decode(block_b64.encode("ascii"))
-                        store[(file_name, stripe_idx, disk_index)] = block
-                        resp2 = {"status": "SUCCESS"}
-                    except Exception as e:
-                        resp2 = {"status": "FAILURE", "error": f"decode error: {e}"}
-
-                c_sock.sendto(json.dumps(resp2).encode(), addr2)
-            elif msg2.get("cmd") == "read-block":
-                a2 = msg2.get("args", {})
-                file_name  = a2.get("file_name")
-                stripe_idx = a2.get("stripe_idx")
-                disk_index = a2.get("disk_index")
-
-                if mode["state"] == "fail":
-                    c_sock.sendto(json.dumps({"status": "FAILURE", "error": "simulated failure"}).encode(), addr2)
-                    continue
-
-                ok = True
+                    # bytes, spliced into the reply by blockio.send_msg
+                    resp2 = {"status": "SUCCESS", "block_b64": base64.b64encode(block)}
+                    if enc:
+                        resp2["enc"] = enc
+
+        elif cmd2 == "fail":
+            clear_store()
+            mode["state"] = "fail"
+            resp2 = {"status": "SUCCESS", "event": "fail-complete"}
+        elif cmd2 == "wipe":
+            clear_store()
+            resp2 = {"status": "SUCCESS"}
+        elif cmd2 == "delete-object":
+            names = (msg2.get("args") or {}).get("file_names")
+            if not isinstance(names, list) or not all(isinstance(x, str) for x in names):
+                resp2 = {"status": "FAILURE", "error": "file_names must be a list of names"}
+            else:
+                resp2 = {"status": "SUCCESS", "deleted": sum(delete_object(x) for x in names)}
+        elif cmd2 == "set-mode":
+            a2 = msg2.get("args", {})
+            state = (a2 or {}).get("state")
+            if state in ("normal", "fail"):
+                mode["state"] = state
+                resp2 = {"status": "SUCCESS", "mode": mode["state"]}
+            else:
+                resp2 = {"status": "FAILURE", "error": "state must be 'normal' or 'fail'"}
+        elif cmd2 == "stats":
+            with stats_lock:
+                if (msg2.get("args") or {}).get("reset"):
+                    statslib.reset(stats)
+                snap = statslib.snapshot(stats)
+                moved = sum(c["bytes_in"] + c["bytes_out"] for c in stats["cmds"].values())
+            snap["blocks"] = len(store)
+            snap["objects"] = len(objects)
+            snap["stored_bytes"] = load["stored_bytes"]
+            snap["buffers"] = blockio.POOL.snapshot(moved)
+            snap["io"] = sched.snapshot()
+            resp2 = {"status": "SUCCESS", "disk_name": args.disk_name, "stats": snap}
+        elif cmd2 == "trace-dump":
+            # Requests come off the network, so they only pick a file name under --trace-dir.
+            name = (msg2.get("args") or {}).get("name") or f"trace-{args.disk_name}.jsonl"
+            if not isinstance(name, str) or name != os.path.basename(name) or name.startswith("."):
+                resp2 = {"status": "FAILURE", "error": "name must be a plain file name"}
+            else:
+                path = os.path.join(args.trace_dir, name)
                 try:
-                    stripe_idx = int(stripe_idx)
-                    disk_index = int(disk_index)
-                except Exception:
-                    ok = False
-
-                key = (file_name, stripe_idx, disk_index)
-                if not ok or not file_name or key not in store:
-                    resp2 = {"status": "FAILURE", "error": "not found"}
-                else:
-                    block = store[key]
-                    resp2 = {"status": "SUCCESS", "block_b64": base64.b64encode(block).decode("ascii")}
-                c_sock.sendto(json.dumps(resp2).encode(), addr2)
-
-            elif msg2.get("cmd") == "fail":
-                store.clear()
-                mode["state"] = "fail"
-                resp2 = {"status": "SUCCESS", "event": "fail-complete"}
-                c_sock.sendto(json.dumps(resp2).encode(), addr2)
-            elif msg2.get("cmd") == "wipe":
-                store.clear()
-                resp2 = {"status": "SUCCESS"}
-                c_sock.sendto(json.dumps(resp2).encode(), addr2)
-            elif msg2.get("cmd") == "set-mode":
-                a2 = msg2.get("args", {})
-                state = (a2 or {}).get("state")
-                if state in ("normal", "fail"):
-                    mode["state"] = state
-                    resp2 = {"status": "SUCCESS", "mode": mode["state"]}
+                    resp2 = {"status": "SUCCESS", "path": path, "records": tracing.dump(path)}
+                except OSError as e:
+                    resp2 = {"status": "FAILURE", "error": f"dump failed: {e}"}
+        else:
+            cmd2 = "unsupported"
+            resp2 = {"status": "FAILURE", "error": "unsupported"}
+        return cmd2, resp2
+
+    def reply(msg2, cmd2, resp2, addr2, n_in, t0):
+        if msg2 and "req_id" in msg2:
+            resp2["req_id"] = msg2["req_id"]
+        n_out = blockio.send_msg(c_sock, resp2, addr2)
+        # Measured from receipt, so time spent queued in the scheduler counts.
+        elapsed = time.perf_counter_ns() - t0
+        with stats_lock:
+            load["requests"] += 1
+            load["latency_ns"] += elapsed
+            statslib.record(stats, cmd2, resp2["status"] == "SUCCESS", n_in, n_out, elapsed)
+        tracing.event("debug", "request", cmd=cmd2, frm=addr2, status=resp2["status"],
+                      error=resp2.get("error"), us=elapsed // 1000)
+
+    def io_class(msg2):
+        """Scheduler class of a block request (the client may name one in
+        args.io_class); None for control commands, which are answered at once."""
+        cmd2 = msg2.get("cmd") if msg2 else None
+        if cmd2 not in ("read-block", "write-block"):
+            return None
+        cls = (msg2.get("args") or {}).get("io_class")
+        if cls in iosched.CLASSES:
+            return cls
+        return "read" if cmd2 == "read-block" else "write"
+
+    def content_loop():
+        # Receives and decodes into one pooled buffer, then queues block requests
+        # by class; io_worker threads serve them in weighted fair order.
+        rbuf = blockio.POOL.get(blockio.DATAGRAM)
+        while True:
+            n_in, addr2 = c_sock.recvfrom_into(rbuf)
+            t0 = time.perf_counter_ns()
+            msg2 = blockio.decode_msg(rbuf, n_in)
+            # A malformed request must not take down the only receiving thread.
+            try:
+                cls = io_class(msg2)
+                if cls is None:
+                    reply(msg2, *handle(msg2), addr2, n_in, t0)
                 else:
-                    resp2 = {"status": "FAILURE", "error": "state must be 'normal' or 'fail'"}
-                c_sock.sendto(json.dumps(resp2).encode(), addr2)
-            else:
-                c_sock.sendto(json.dumps({"status": "FAILURE", "error": "unsupported"}).encode(), addr2)
+                    sched.submit(cls, (msg2, addr2, n_in, t0))
+            except Exception as e:
+                tracing.event("error", "request-failed", cmd=msg2.get("cmd") if msg2 else None, error=repr(e))
+
+    def io_worker():
+        while True:
+            cls, (msg2, addr2, n_in, t0) = sched.next()
+            try:
+                reply(msg2, *handle(msg2), addr2, n_in, t0)
+            except Exception as e:
+                tracing.event("error", "request-failed", cmd=msg2.get("cmd"), error=repr(e))
+            finally:
+                sched.done(cls)
 
     threading.Thread(target=content_loop, daemon=True).start()
+    for _ in range(args.io_workers):
+        threading.Thread(target=io_worker, daemon=True).start()
+    threading.Thread(target=manager_loop, daemon=True).start()
+    if args.heartbeat_interval > 0:
+        threading.Thread(target=heartbeat_loop, daemon=True).start()
 
     print("Disk registered. Make sure to press Ctrl+C to exit.")
     try:
@@ -0,0 +1,96 @@
+import threading, time
+from collections import deque
+from stats import NBUCKETS, hist_quantile
+
+CLASSES = ("read", "write", "background")
+DEFAULT_WEIGHTS = {"read": 8, "write": 4, "background": 1}
+DEFAULT_CAPS = {"read": 2, "write": 2, "background": 1}
+QUEUE_LIMIT = 4096  # per class; beyond this requests are dropped like an overflowing socket
+
+def parse_classes(spec: str, defaults: dict) -> dict:
+    """'read=8,background=1' -> per-class ints, the rest taken from defaults."""
+    out = dict(defaults)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        if name not in CLASSES or not value.isdigit() or int(value) < 1:
+            raise ValueError(f"expected class=positive-int with class in {', '.join(CLASSES)}: {part!r}")
+        out[name] = int(value)
+    return out
+
+class IOScheduler:
+    """Per-class request queues served by weighted fair sharing.
+
+    Each class has a virtual time that advances by 1/weight per request served;
+    the next request comes from the non-empty class with the smallest virtual
+    time whose in-flight count is under its cap. A class that goes idle cannot
+    bank credit: it rejoins at the virtual time of the classes still queued.
+    Worker threads call next() and then done() once the request is answered."""
+
+    def __init__(self, weights: dict, caps: dict, limit: int = QUEUE_LIMIT):
+        self.weights = weights
+        self.caps = caps
+        self.limit = limit
+        self.cond = threading.Condition()
+        self.queues = {c: deque() for c in CLASSES}
+        self.vtime = {c: 0.0 for c in CLASSES}
+        self.running = {c: 0 for c in CLASSES}
+        self.counts = {c: {"queued": 0, "served": 0, "dropped": 0, "max_depth": 0,
+                           "wait_ns": 0, "hist": [0] * NBUCKETS} for c in CLASSES}
+
+    def submit(self, cls: str, item) -> bool:
+        with self.cond:
+            q = self.queues[cls]
+            c = self.counts[cls]
+            if len(q) >= self.limit:
+                c["dropped"] += 1
+                return False
+            if not q and not self.running[cls]:
+                busy = [self.vtime[o] for o in CLASSES if o != cls and (self.queues[o] or self.running[o])]
+                if busy:
+                    self.vtime[cls] = max(self.vtime[cls], min(busy))
+            q.append((time.perf_counter_ns(), item))
+            c["queued"] += 1
+            c["max_depth"] = max(c["max_depth"], len(q))
+            self.cond.notify()
+            return True
+
+    def _pick(self):
+        ready = [c for c in CLASSES if self.queues[c] and self.running[c] < self.caps[c]]
+        return min(ready, key=lambda c: self.vtime[c]) if ready else None
+
+    def next(self):
+        """Block until a request may run; returns (class, item)."""
+        with self.cond:
+            while (cls := self._pick()) is None:
+                self.cond.wait()
+            t_in, item = self.queues[cls].popleft()
+            self.running[cls] += 1
+            self.vtime[cls] += 1.0 / self.weights[cls]
+            wait = time.perf_counter_ns() - t_in
+            c = self.counts[cls]
+            c["served"] += 1
+            c["wait_ns"] += wait
+            c["hist"][min((wait // 1000).bit_length(), NBUCKETS - 1)] += 1
+            return cls, item
+
+    def done(self, cls: str) -> None:
+        with self.cond:
+            self.running[cls] -= 1
+            self.cond.notify()
+
+    def snapshot(self) -> dict:
+        """Per-class depth, in-flight, counters and queue wait (mean, p50, p99 in ms)."""
+        with self.cond:
+            out = {}
+            for cls in CLASSES:
+                c = self.counts[cls]
+                out[cls] = {
+                    "weight": self.weights[cls], "cap": self.caps[cls],
+                    "depth": len(self.queues[cls]), "running": self.running[cls],
+                    "queued": c["queued"], "served": c["served"], "dropped": c["dropped"],
+                    "max_depth": c["max_depth"],
+                    "wait_mean_ms": round(c["wait_ns"] / c["served"] / 1e6, 4) if c["served"] else 0.0,
+                    "wait_p50_ms": hist_quantile(c["hist"], 0.50),
+                    "wait_p99_ms": hist_quantile(c["hist"], 0.99),
+                }
+            return out
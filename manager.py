@@ -1,12 +1,265 @@
 import socket, json, argparse
-import random
+import random, time, itertools, secrets, threading
+import stats as statslib
+import blockio
+from blockio import take_page
+from striping import pack_extents
+
+JOB_PART_BYTES = 48000      # object-list budget per disk job datagram
+RECLAIM_TIMEOUT = 1.0       # seconds per delete-object attempt while reclaiming
+LEASE_PRUNE = 4096          # expired leases are swept once this many are on record
+RECLAIM_BATCH = 256         # garbage objects deleted per DSS per reclaim round
+RECLAIM_BATCH_BYTES = 48000 # budget for the names in one delete-object datagram
+RECLAIM_DEADLINE = 10.0     # seconds after which a reclaim round that never reported is redone
+JOB_TICK = 1.0              # seconds between checks on a running peer rebuild or restripe
+REPLY_PAGE_BYTES = 48000    # budget for listed items in one reply datagram
+
+# Commands served by the main dispatch below the busy check; any other name is
+# counted in stats as "unsupported", so stray names cannot grow the stats reply.
+COMMANDS = frozenset((
+    "register-user", "register-disk", "configure-dss", "ls", "copy-prepare", "copy-complete", "copy-abort",
+    "read-prepare", "delete-file", "deregister-user", "deregister-disk", "disk-failure", "rebuild-objects",
+    "decommission-dss", "expand-dss", "peer-rebuild", "rebuild-status", "recovery-complete",
+    "decommission-complete"))
 
 def power_of_two(x: int) -> bool:
     return x > 0 and (x & (x - 1)) == 0
 
+def disk_alive(info: dict, now: float, misses: int) -> bool:
+    """A disk is alive until it misses `misses` heartbeats in a row.
+    Disks registered without a heartbeat interval are always taken to be alive."""
+    interval = info.get("hb_interval") or 0
+    return interval <= 0 or now - info["last_seen"] <= misses * interval
+
+def placement_key(info: dict):
+    """Sort key for choosing DSS members: least busy, then least full, then fastest.
+    The random last element spreads DSSes over otherwise identical disks."""
+    load = info["load"]
+    return (round(load["req_rate"]), load["stored_bytes"], load["latency_ms"], random.random())
+
+def dss_layout(dss_name: str, dss: dict, disks: dict, alive, n: int | None = None) -> dict:
+    """The DSS description handed to clients: geometry, codec options and disk endpoints.
+    alive(disk_name) flags disks that have gone quiet so clients can skip them.
+    n selects an older, narrower width; expansion only appends disks, so that
+    layout is a prefix of the current one."""
+    n = n or dss["n"]
+    disk_eps = []
+    for dn in dss["disks"][:n]:
+        info = disks.get(dn)
+        disk_eps.append({"disk_name": dn, "ip": info["ip"], "c_port": info["c_port"], "alive": alive(dn)})
+    return {
+        "dss_name": dss_name,
+        "n": n,
+        "striping_unit": dss["striping_unit"],
+        "codec": dss["codec"],
+        "disks": disk_eps
+    }
+
+def valid_extents(extents, size: int, stripe_data: int) -> bool:
+    """Packed-file extents are [stripe, offset, length] triples inside one stripe's data area."""
+    if not isinstance(extents, list):
+        return False
+    total = 0
+    for ext in extents:
+        if not (isinstance(ext, list) and len(ext) == 3 and all(isinstance(x, int) for x in ext)):
+            return False
+        stripe, off, length = ext
+        if stripe < 0 or off < 0 or length <= 0 or off + length > stripe_data:
+            return False
+        total += length
+    return total == size
+
+def discard(dss: dict, obj: str) -> None:
+    """Queue an object nothing refers to any more for lazy reclaim. It is tagged
+    with the current read epoch, and reads or leases begun from now on are in a
+    later one, so the object can go once every read of its epoch or earlier ends."""
+    dss["garbage"].append([obj, dss["epoch"]])
+    dss["epoch"] += 1
+
+def release_file(dss: dict, file_name, keep=None) -> None:
+    """Drop a file's claim on its blocks: its own object (unless that is `keep`)
+    or its share of a pack, which becomes garbage once no live files remain."""
+    old = dss["files"].get(file_name)
+    if not old:
+        return
+    if old.get("pack") in dss["packs"]:
+        pack = dss["packs"][old["pack"]]
+        pack["live"] -= 1
+        if pack["live"] <= 0:
+            del dss["packs"][old["pack"]]
+            discard(dss, pack.get("object", old["pack"]))
+    elif not old.get("pack") and old.get("object", file_name) != keep:
+        discard(dss, old.get("object", file_name))
+
+def commit_file(dss: dict, owner, entry: dict) -> dict:
+    """Record one copied file's metadata in dss; return its per-file status."""
+    try:
+        size = int(entry.get("size"))
+    except Exception:
+        size = -1
+    pack = entry.get("pack")
+    error = None
+    if not entry.get("file_name"):
+        error = "missing file_name"
+    elif size < 0:
+        error = "invalid size"
+    elif pack is not None and pack not in dss["packs"]:
+        error = "unknown pack"
+    elif pack is not None and not valid_extents(entry.get("extents"), size, (dss["n"] - 1) * dss["striping_unit"]):
+        error = "invalid extents"
+    if error:
+        if pack is None and isinstance(entry.get("object"), str) and entry["object"]:
+            discard(dss, entry["object"])
+        return {"status": "FAILURE", "error": error}
+
+    # Clients write every copy under a fresh object name, so the object an
+    # overwritten file used can be reclaimed without touching the new data.
+    obj = entry.get("object") if isinstance(entry.get("object"), str) and entry.get("object") else entry["file_name"]
+    if pack is not None:
+        # Claimed before the old entry is released: if that was in the same pack
+        # (the file listed twice in one batch), it must not empty and drop the pack.
+        dss["packs"][pack]["live"] += 1
+    release_file(dss, entry["file_name"], keep=None if pack is not None else obj)
+    dss["version"] += 1
+    meta = {"owner": owner, "size": size, "sha256": entry.get("sha256"), "n": dss["n"]}
+    if pack is None and obj != entry["file_name"]:
+        meta["object"] = obj
+    if pack is not None:
+        meta["pack"] = pack
+        meta["extents"] = entry["extents"]
+    dss["files"][entry["file_name"]] = meta
+    return {"status": "SUCCESS"}
+
+def rebuild_objects(dss: dict) -> list:
+    """[object, size, n] of every striped object in dss: unpacked files and the packs."""
+    objects = [[m.get("object", f), m["size"], m["n"]] for f, m in dss["files"].items() if not m.get("pack")]
+    return objects + [[info.get("object", p), info["size"], info["n"]] for p, info in dss["packs"].items()]
+
+def job_messages(cmd: str, fields: dict, objects: list) -> list[dict]:
+    """Split a disk job (peer rebuild or restripe) into datagrams; the last one
+    carries final=true. Each is numbered (part of parts) so a disk can drop the
+    copies of a resend. Parts are sized by their JSON, in which one non-ASCII
+    character takes up to 12 bytes."""
+    parts, pos = [], 0
+    while True:
+        part, _ = take_page(itertools.islice(objects, pos, None), JOB_PART_BYTES)
+        parts.append(part)
+        pos += len(part)
+        if pos >= len(objects):
+            break
+    return [{"cmd": cmd, "args": {**fields, "objects": part, "part": i, "parts": len(parts),
+                                  "final": i == len(parts) - 1}}
+            for i, part in enumerate(parts)]
+
+def file_listing(meta: dict) -> dict:
+    """The parts of a file's metadata shown by ls (extents are left out)."""
+    out = {"owner": meta["owner"], "size": meta["size"], "sha256": meta.get("sha256"), "n": meta["n"]}
+    if meta.get("pack"):
+        out["pack"] = meta["pack"]
+    return out
+
+def restripe_objects(dss: dict) -> list:
+    """[kind, name, object, size, n] of every striped object narrower than the DSS."""
+    objs = [["file", f, m.get("object", f), m["size"], m["n"]]
+            for f, m in dss["files"].items() if not m.get("pack") and m["n"] < dss["n"]]
+    return objs + [["pack", p, info.get("object", p), info["size"], info["n"]]
+                   for p, info in dss["packs"].items() if info["n"] < dss["n"]]
+
+def apply_restripe(dss: dict, a: dict) -> None:
+    """Point one file or pack at its restriped copy, unless it changed meanwhile;
+    whichever copy is no longer referenced becomes garbage."""
+    name, old_obj, new_obj, n = a.get("name"), a.get("old_object"), a.get("object"), a.get("n")
+    if a.get("failed"):
+        discard(dss, new_obj)
+        return
+    if a.get("kind") == "pack":
+        entry = dss["packs"].get(name)
+    else:
+        entry = dss["files"].get(name)
+        if entry and entry.get("pack"):
+            entry = None
+    if entry is None or entry.get("object", name) != old_obj:
+        discard(dss, new_obj)
+        return
+    if a.get("kind") == "pack":
+        # Packed files' extents are offsets in the pack's data area, whose
+        # stripes are wider now; re-split each file's byte range.
+        b = dss["striping_unit"]
+        old_sd, new_sd = (entry["n"] - 1) * b, (n - 1) * b
+        for meta in dss["files"].values():
+            if meta.get("pack") == name:
+                if meta["extents"]:  # an empty file has no extents to move
+                    stripe, off, _ = meta["extents"][0]
+                    meta["extents"] = pack_extents(stripe * old_sd + off, meta["size"], new_sd)
+                meta["n"] = n
+    entry["object"] = new_obj
+    entry["n"] = n
+    discard(dss, old_obj)
+    dss["version"] += 1
+
+def reclaim_worker(dss_name: str, round_id: int, targets: list, names: list, manager_addr) -> None:
+    """Background thread deleting garbage objects from every disk of a DSS. The
+    outcome goes back to the manager loop as reclaim-done for round_id; names
+    that a disk did not confirm are queued again there."""
+    sock = blockio.open_socket()
+    failed, blocks = names, 0
+    try:
+        got = blockio.batch_call(sock, itertools.count(1), [
+            (t, "delete-object", {"file_names": names}) for t in targets], RECLAIM_TIMEOUT)
+        failed = names if any(r is None for r in got) else []
+        blocks = sum(r.get("deleted", 0) for r in got if r)
+    finally:
+        msg = {"cmd": "reclaim-done", "args": {"dss_name": dss_name, "round": round_id, "objects": len(names),
+                                               "failed": failed, "blocks": blocks}}
+        sock.sendto(json.dumps(msg).encode(), manager_addr)
+        sock.close()
+
+def reclaim_ticker(interval: float, manager_addr) -> None:
+    """Wake the manager loop every interval seconds to start reclaim rounds."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    tick = json.dumps({"cmd": "reclaim-tick"}).encode()
+    while True:
+        time.sleep(interval)
+        sock.sendto(tick, manager_addr)
+
+def job_watch(cmd: str, dss_name: str, job_id: int, manager_addr) -> None:
+    """Send cmd (rebuild-tick or restripe-tick) for one disk job every
+    JOB_TICK seconds until the manager answers that the job is no longer running."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(JOB_TICK)
+    tick = json.dumps({"cmd": cmd, "req_id": job_id,
+                       "args": {"dss_name": dss_name, "job": job_id}}).encode()
+    try:
+        while True:
+            time.sleep(JOB_TICK)
+            sock.sendto(tick, manager_addr)
+            try:
+                resp = json.loads(sock.recv(65535))
+            except (OSError, ValueError):  # socket.timeout is an OSError
+                continue
+            if resp.get("state") != "running":
+                return
+    finally:
+        sock.close()
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("manager_port", type=int)
+    ap.add_argument("--no-stats", action="store_true", help="disable per-command instrumentation")
+    ap.add_argument("--stats-file", help="periodically write Prometheus text metrics here")
+    ap.add_argument("--stats-interval", type=float, default=10.0)
+    ap.add_argument("--heartbeat-misses", type=int, default=3,
+                    help="missed heartbeats after which a disk is reported as not alive")
+    ap.add_argument("--lease-seconds", type=float, default=5.0,
+                    help="lifetime of read leases handed out with read-prepare (0 disables them)")
+    ap.add_argument("--reclaim-interval", type=float, default=1.0,
+                    help="seconds between rounds deleting unreferenced objects from disks (0 disables)")
+    ap.add_argument("--restripe-rate", type=float, default=8.0,
+                    help="default MB/s cap for background restriping after expand-dss (0 for none)")
+    ap.add_argument("--rebuild-timeout", type=float, default=30.0,
+                    help="seconds without a progress report after which a peer rebuild is failed")
+    ap.add_argument("--restripe-timeout", type=float, default=30.0,
+                    help="seconds without a report from the restriping disk after which the restripe is failed")
     args = ap.parse_args()
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -16,24 +269,277 @@ def main():
     disks = {}
     dsses = {} 
     busy = {"op": None, "dss": None, "user": None} 
-    reads_in_progress = {} 
+    reads_in_progress = {}  # dss_name -> {read epoch: open reads}
+    leases = {}    # lease_id -> {"dss", "expires"}: cached read-prepares that count as reads
+    lease_ids = itertools.count(1)
+    rebuilds = {}  # dss_name -> latest peer-rebuild job and its progress
+    copy_batches = {}  # (dss_name, owner, batch) -> reply to a bulk copy-complete of the latest copy session
+    rebuild_sends = {}  # dss_name -> (disk address, job datagrams) until the disk first reports
+    restripe_sends = {}  # likewise for restripe jobs
+    job_ids = itertools.count(1)
+    reclaim_rounds = itertools.count(1)
+    stats = statslib.new_stats(enabled=not args.no_stats)
+    if args.stats_file:
+        statslib.start_dumper(stats, args.stats_file, "dss_manager", interval=args.stats_interval)
+
+    def alive(disk_name):
+        return disk_alive(disks[disk_name], time.monotonic(), args.heartbeat_misses)
+
+    def send_reply(msg, resp, addr):
+        """Send resp to addr, echoing msg's req_id; return the bytes sent. A reply
+        that cannot be sent (most likely over the datagram limit) is replaced, in
+        resp as well, by a short FAILURE, so the sender still gets an answer."""
+        if "req_id" in msg:
+            resp["req_id"] = msg["req_id"]
+        out = json.dumps(resp).encode()
+        try:
+            sock.sendto(out, addr)
+        except OSError as e:
+            error = f"reply not sent ({len(out)} bytes): {e}"
+            resp.clear()
+            resp.update(status="FAILURE", error=error)
+            if "req_id" in msg:
+                resp["req_id"] = msg["req_id"]
+            out = json.dumps(resp).encode()
+            sock.sendto(out, addr)
+        return out
+
+    def send_job(target, parts):
+        """Send a disk job's datagrams; the error if one could not be sent, else None."""
+        for part in parts:
+            try:
+                sock.sendto(part, target)
+            except OSError as e:
+                return f"job not sent ({len(part)} bytes): {e}"
+        return None
+
+    def prune_leases(now):
+        for lid in [lid for lid, l in leases.items() if l["expires"] <= now]:
+            del leases[lid]
+
+    def open_reads(dss_name):
+        """Reads in progress on dss_name, counting unexpired read leases. Finding
+        leases stops new ones being granted until a lease period after the last
+        one runs out, so a refused disk-failure or decommission can get in."""
+        now = time.monotonic()
+        prune_leases(now)
+        held = [l["expires"] for l in leases.values() if l["dss"] == dss_name]
+        if held:
+            dsses[dss_name]["lease_hold_until"] = max(held) + args.lease_seconds
+        return sum(reads_in_progress.get(dss_name, {}).values()) + len(held)
+
+    def oldest_read_epoch(dss_name):
+        """Earliest epoch with a read or lease still open on dss_name, or None."""
+        now = time.monotonic()
+        epochs = [l["epoch"] for l in leases.values() if l["dss"] == dss_name and l["expires"] > now]
+        epochs += list(reads_in_progress.get(dss_name, {}))
+        return min(epochs) if epochs else None
+
+    self_addr = ("127.0.0.1", args.manager_port)
+    if args.reclaim_interval > 0:
+        threading.Thread(target=reclaim_ticker, args=(args.reclaim_interval, self_addr), daemon=True).start()
 
     print(f"Manager listening on UDP {args.manager_port}")
     while True:
-        data, addr = sock.recvfrom(12000)  
+        data, addr = sock.recvfrom(65535)
+        t0 = time.perf_counter_ns()
         msg = json.loads(data.decode("utf-8"))
         cmd = msg.get("cmd","")
 
+        if cmd == "stats":
+            if (msg.get("args") or {}).get("reset"):
+                statslib.reset(stats)
+            send_reply(msg, {"status": "SUCCESS", "stats": statslib.snapshot(stats)}, addr)
+            continue
+
+        if cmd == "heartbeat":
+            # Fire-and-forget: disks do not read replies on their manager socket.
+            a = msg.get("args") or {}
+            info = disks.get(a.get("disk_name"))
+            if info is not None:
+                if not alive(a.get("disk_name")):
+                    statslib.incr(stats, "heartbeats_resumed")
+                info["last_seen"] = time.monotonic()
+                for k, conv in (("stored_bytes", int), ("req_rate", float), ("latency_ms", float)):
+                    try:
+                        info["load"][k] = max(0, conv(a.get(k, 0)))
+                    except (TypeError, ValueError):
+                        pass
+            statslib.record(stats, cmd, info is not None, len(data), 0, time.perf_counter_ns() - t0)
+            continue
+
+        if cmd == "rebuild-tick":
+            # From the job's job_watch thread. Job datagrams can be lost, so they
+            # are resent until the disk first reports; a disk that stops reporting or
+            # stops heartbeating has its job failed so the disk-failure op is released.
+            a = msg.get("args") or {}
+            dss_name = a.get("dss_name")
+            job = rebuilds.get(dss_name)
+            ok = job is not None and job["job"] == a.get("job") and job["state"] == "running"
+            if ok:
+                stalled = time.monotonic() - job["updated"] > args.rebuild_timeout
+                if stalled or (job["disk_name"] in disks and not alive(job["disk_name"])):
+                    job.update(state="failed", error="no progress from disk" if stalled else "disk not alive",
+                               finished=time.time())
+                    rebuild_sends.pop(dss_name, None)
+                    statslib.incr(stats, "peer_rebuilds_failed")
+                    if busy["op"] == "disk-failure" and busy["dss"] == dss_name:
+                        busy.update({"op": None, "dss": None, "user": None})
+                elif dss_name in rebuild_sends:
+                    send_job(*rebuild_sends[dss_name])
+                    statslib.incr(stats, "peer_rebuild_resends")
+            resp = {"status": "SUCCESS", "state": job["state"] if ok else None, "req_id": msg.get("req_id")}
+            sock.sendto(json.dumps(resp).encode(), addr)
+            statslib.record(stats, cmd, ok, len(data), 0, time.perf_counter_ns() - t0)
+            continue
+
+        if cmd == "rebuild-progress":
+            # Also fire-and-forget. A final report ends the disk-failure operation
+            # the job was started under, so the rebuild outlives the user that began it.
+            a = msg.get("args") or {}
+            job = rebuilds.get(a.get("dss_name"))
+            ok = job is not None and job["job"] == a.get("job") and job["state"] == "running"
+            if ok:
+                rebuild_sends.pop(a.get("dss_name"), None)
+                for k in ("done", "total", "failed", "state", "error"):
+                    if k in a:
+                        job[k] = a[k]
+                job["updated"] = time.monotonic()
+                if job["state"] != "running":
+                    statslib.incr(stats, "peer_rebuilds_" + ("ok" if job["state"] == "done" else "failed"))
+                    if busy["op"] == "disk-failure" and busy["dss"] == a.get("dss_name"):
+                        busy.update({"op": None, "dss": None, "user": None})
+            statslib.record(stats, cmd, ok, len(data), 0, time.perf_counter_ns() - t0)
+            continue
+
+        if cmd in ("restripe-tick", "restripe-progress", "restripe-commit"):
+            # A restripe runs on one of the DSS's disks (see disk.py). It reports
+            # progress fire-and-forget and sends each object switch, numbered by
+            # seq, and then final=true as a request it resends until answered or
+            # until --restripe-timeout passes, after which this side has failed the
+            # job anyway; seq makes a resent switch apply once. Job datagrams are
+            # resent until the first report, and a disk that goes quiet has its job failed.
+            a = msg.get("args") or {}
+            dss_name = a.get("dss_name")
+            dss = dsses.get(dss_name)
+            job = dss.get("restripe") if dss else None
+            ok = job is not None and job.get("job") == a.get("job")
+            running = ok and job["state"] == "running"
+            if running and cmd == "restripe-tick":
+                stalled = time.monotonic() - job["updated"] > args.restripe_timeout
+                if stalled or (job["disk_name"] in disks and not alive(job["disk_name"])):
+                    job.update(state="failed", error="no report from disk" if stalled else "disk not alive",
+                               finished=time.time())
+                    restripe_sends.pop(dss_name, None)
+                    statslib.incr(stats, "restripes_failed")
+                elif dss_name in restripe_sends:
+                    send_job(*restripe_sends[dss_name])
+                    statslib.incr(stats, "restripe_resends")
+            elif running:
+                restripe_sends.pop(dss_name, None)
+                job["updated"] = time.monotonic()
+                if a.get("state") == "failed" or (cmd == "restripe-commit" and a.get("final")):
+                    failed = a.get("state") == "failed" or job["failed"] or a.get("error")
+                    job.update(state="failed" if failed else "done", finished=time.time())
+                    if a.get("error"):
+                        job["error"] = a["error"]
+                    statslib.incr(stats, "restripes_" + job["state"])
+                elif cmd == "restripe-commit" and a.get("seq") == job["seq"]:
+                    apply_restripe(dss, a)
+                    job["seq"] += 1
+                    job["done"] += 1
+                    job["failed"] += bool(a.get("failed"))
+                    job["bytes"] += int(a.get("bytes") or 0)
+            elif ok and cmd == "restripe-commit" and a.get("seq") == job["seq"]:
+                # A copy finished after its job was failed: nothing points to it.
+                discard(dss, a.get("object"))
+                job["seq"] += 1
+            if cmd != "restripe-progress":
+                resp = {"status": "SUCCESS" if ok else "FAILURE", "state": job["state"] if ok else None,
+                        "req_id": msg.get("req_id")}
+                if not ok:
+                    resp["error"] = "no such restripe job"
+                sock.sendto(json.dumps(resp).encode(), addr)
+            statslib.record(stats, cmd, ok, len(data), 0, time.perf_counter_ns() - t0)
+            continue
+
+        if cmd in ("reclaim-tick", "reclaim-done"):
+            # Lazy reclaim: garbage is deleted from the disks in the background,
+            # oldest first, once no open read or lease can still refer to it.
+            # reclaim-done is a datagram that can be lost, so a round that has not
+            # reported by its deadline is given up and its names queued again.
+            a = msg.get("args") or {}
+            now = time.monotonic()
+            if cmd == "reclaim-done":
+                dss = dsses.get(a.get("dss_name"))
+                if dss and (dss.get("reclaiming") or {}).get("round") == a.get("round"):
+                    dss["reclaiming"] = None
+                    for name in a.get("failed") or []:
+                        discard(dss, name)
+                    statslib.incr(stats, "objects_reclaimed", int(a.get("objects", 0)) - len(a.get("failed") or []))
+            else:
+                for dss_name, dss in dsses.items():
+                    garbage = dss["garbage"]
+                    pending = dss.get("reclaiming")
+                    if pending and now >= pending["deadline"]:
+                        # Deleting twice is harmless, so the names are simply queued again.
+                        for name in pending["names"]:
+                            discard(dss, name)
+                        dss["reclaiming"] = pending = None
+                        statslib.incr(stats, "reclaim_timeouts")
+                    if pending or not garbage or busy["dss"] == dss_name:
+                        continue
+                    oldest = oldest_read_epoch(dss_name)
+                    k = 0
+                    while k < min(len(garbage), RECLAIM_BATCH) and (oldest is None or garbage[k][1] < oldest):
+                        k += 1
+                    # Names are bounded by their JSON so delete-object fits a datagram.
+                    names, _ = take_page((g[0] for g in garbage[:k]), RECLAIM_BATCH_BYTES)
+                    if names:
+                        del garbage[:len(names)]
+                        dss["reclaiming"] = {"round": next(reclaim_rounds), "names": names,
+                                             "deadline": now + RECLAIM_DEADLINE}
+                        targets = [(disks[dn]["ip"], int(disks[dn]["c_port"])) for dn in dss["disks"]]
+                        threading.Thread(target=reclaim_worker, daemon=True, args=(
+                            dss_name, dss["reclaiming"]["round"], targets, names, self_addr)).start()
+            statslib.record(stats, cmd, True, len(data), 0, time.perf_counter_ns() - t0)
+            continue
+
+        if cmd in ("read-complete", "lease-release"):
+            # Ending a read or handing back leases never conflicts with an operation,
+            # and the operation may be waiting on exactly that, so neither is refused as busy.
+            a = msg.get("args") or {}
+            if cmd == "read-complete":
+                open_reads_by_epoch = reads_in_progress.get(a.get("dss_name"))
+                if open_reads_by_epoch:
+                    # Clients that do not echo the epoch close their oldest open read.
+                    epoch = a.get("epoch") if a.get("epoch") in open_reads_by_epoch else min(open_reads_by_epoch)
+                    open_reads_by_epoch[epoch] -= 1
+                    if open_reads_by_epoch[epoch] <= 0:
+                        del open_reads_by_epoch[epoch]
+                resp = {"status": "SUCCESS"}
+            else:
+                ids = a.get("lease_ids") if isinstance(a.get("lease_ids"), list) else []
+                released = sum(leases.pop(lid, None) is not None for lid in ids if isinstance(lid, int))
+                resp = {"status": "SUCCESS", "released": released}
+            if "req_id" in msg:
+                resp["req_id"] = msg["req_id"]
+            out = json.dumps(resp).encode()
+            sock.sendto(out, addr)
+            statslib.record(stats, cmd, True, len(data), len(out), time.perf_counter_ns() - t0)
+            continue
+
         if busy["op"] is not None:
             allowed_map = {
-                "copy": "copy-complete",
-                "decommission": "decommission-complete",
-                "disk-failure": "recovery-complete",
+                "copy": ("copy-complete", "copy-abort"),
+                "decommission": ("decommission-complete",),
+                "disk-failure": ("recovery-complete", "peer-rebuild", "rebuild-status", "rebuild-objects"),
             }
-            allowed = allowed_map.get(busy["op"])
-            if cmd != allowed:
-                resp = {"status": "FAILURE", "error": f"busy: {busy['op']} in progress"}
-                sock.sendto(json.dumps(resp).encode(), addr)
+            allowed = allowed_map.get(busy["op"], ())
+            if cmd not in allowed:
+                out = send_reply(msg, {"status": "FAILURE", "error": f"busy: {busy['op']} in progress"}, addr)
+                statslib.incr(stats, "busy_rejections")
+                statslib.record(stats, cmd if cmd in COMMANDS else "unsupported", False, len(data), len(out), time.perf_counter_ns() - t0)
                 continue
 
         if cmd == "register-user":
@@ -50,7 +556,13 @@ def main():
             if not name or name in disks:
                 resp = {"status":"FAILURE", "error":"duplicate or bad disk_name"}
             else:
-                disks[name] = {"ip":a.get("ip"), "m_port":a.get("m_port"), "c_port":a.get("c_port"), "state":"Free"}
+                try:
+                    hb_interval = max(0.0, float(a.get("heartbeat_interval") or 0))
+                except (TypeError, ValueError):
+                    hb_interval = 0.0
+                disks[name] = {"ip":a.get("ip"), "m_port":a.get("m_port"), "c_port":a.get("c_port"), "state":"Free",
+                               "hb_interval": hb_interval, "last_seen": time.monotonic(),
+                               "load": {"stored_bytes": 0, "req_rate": 0.0, "latency_ms": 0.0}}
                 resp = {"status":"SUCCESS"}
         elif cmd == "configure-dss":
             a = msg.get("args", {})
@@ -62,6 +574,11 @@ def main():
             except Exception:
                 n = -1
                 b = -1
+            codec = {"holes": bool(a.get("holes")), "compress": a.get("compress")}
+            try:
+                codec["level"] = int(a.get("compress_level", 1))
+            except Exception:
+                codec["level"] = -1
 
 
             if not dss_name or dss_name in dsses:
@@ -70,36 +587,59 @@ def main():
                 resp = {"status":"FAILURE", "error":"n must be >= 3"}
             elif not (power_of_two(b) and 128 <= b <= 1024*1024):
                 resp = {"status":"FAILURE", "error":"striping_unit must be a power of two in [128, 1048576]"}
+            elif codec["compress"] not in (None, "zlib") or not 1 <= codec["level"] <= 9:
+                resp = {"status":"FAILURE", "error":"compress must be 'zlib' or null, compress_level in [1, 9]"}
             else:
-                free = sorted([name for name,info in disks.items() if info.get("state") == "Free"])
+                free = [name for name,info in disks.items() if info.get("state") == "Free" and alive(name)]
                 if len(free) < n:
-                    resp = {"status":"FAILURE", "error":"fewer than n disks with state Free"}
+                    resp = {"status":"FAILURE", "error":"fewer than n alive disks with state Free"}
                 else:
-                    chosen = random.sample(free, n)
+                    chosen = sorted(free, key=lambda dn: placement_key(disks[dn]))[:n]
                     for dn in chosen:
                         disks[dn]["state"] = f"InDSS:{dss_name}"
-                    dsses[dss_name] = {"n": n, "striping_unit": b, "disks": chosen, "files": {}}
+                    dsses[dss_name] = {"n": n, "striping_unit": b, "codec": codec, "disks": chosen,
+                                       "files": {}, "packs": {}, "garbage": [], "version": 0, "epoch": 0}
                     resp = {
                         "status": "SUCCESS",
-                        "dss": {"dss_name": dss_name, "n": n, "striping_unit": b, "disks": chosen}
+                        "dss": {"dss_name": dss_name, "n": n, "striping_unit": b, "codec": codec, "disks": chosen}
                     }
 
         elif cmd == "ls":
+            # File listings are paged to fit a datagram: each DSS reports its
+            # file_count and, while files remain, a next cursor to pass back as
+            # ls {dss_name, after} for the following page.
+            a = msg.get("args") or {}
+            only, after = a.get("dss_name"), a.get("after")
             if not dsses:
                 resp = {"status": "FAILURE", "error": "no DSS configured"}
+            elif only is not None and only not in dsses:
+                resp = {"status": "FAILURE", "error": "no such dss"}
             else:
+                budget = REPLY_PAGE_BYTES
+                pages = {}
+                for dn in sorted(dsses) if only is None else [only]:
+                    files = dsses[dn]["files"]
+                    names = sorted(f for f in files if after is None or only is None or f > after)
+                    page, used = take_page(((f, file_listing(files[f])) for f in names), budget) if budget > 0 else ([], 0)
+                    budget -= used
+                    pages[dn] = {"files": dict(page), "file_count": len(files),
+                                 "next": None if len(page) == len(names) else (page[-1][0] if page else after or "")}
                 listing = {
                     "users": sorted(users.keys()),
-                    "disks": [{"name": n, "state": disks[n]["state"]} for n in sorted(disks.keys())],
+                    "disks": [{"name": n, "state": disks[n]["state"], "alive": alive(n),
+                               "load": disks[n]["load"]} for n in sorted(disks.keys())],
                     "dsses": [
                         {
                             "dss_name": dn,
                             "n": dsses[dn]["n"],
                             "striping_unit": dsses[dn]["striping_unit"],
+                            "codec": dsses[dn]["codec"],
                             "disks": dsses[dn]["disks"],
-                            "files": dsses[dn]["files"],
+                            **pages[dn],
+                            "restripe": dsses[dn].get("restripe"),
+                            "garbage": len(dsses[dn]["garbage"]),
                         }
-                        for dn in sorted(dsses.keys())
+                        for dn in pages
                     ],
                     "free_disks": [n for n in sorted(disks.keys()) if disks[n]["state"] == "Free"],
                 }
@@ -115,47 +655,81 @@ def main():
                 resp = {"status": "FAILURE", "error": "no such dss"}
             else:
                 busy.update({"op": "copy", "dss": dss_name, "user": owner})
-                disk_eps = []
-                for dn in dss["disks"]:
-                    info = disks.get(dn)
-                    disk_eps.append({"disk_name": dn, "ip": info["ip"], "c_port": info["c_port"]})
+                copy_batches.clear()
                 resp = {
                     "status": "SUCCESS",
-                    "dss": {
-                        "dss_name": dss_name,
-                        "n": dss["n"],
-                        "striping_unit": dss["striping_unit"],
-                        "disks": disk_eps
-                    },
-                    "file": {"name": file_name}
+                    "dss": dss_layout(dss_name, dss, disks, alive),
+                    "file": {"name": file_name},
+                    "bulk": bool(a.get("bulk")),
                 }
 
         
         elif cmd == "copy-complete":
             a = msg.get("args", {})
             dss_name  = a.get("dss_name")
-            file_name = a.get("file_name")
             owner     = a.get("owner")
-            size      = a.get("size")
+            # A bulk session commits a batch of files per message ("files") and
+            # keeps the copy lock until a message with final=true. Batches carry
+            # an id, and the client resends one until answered, so a resent batch
+            # gets the reply already given instead of being applied twice.
+            entries = a.get("files")
+            bulk = isinstance(entries, list)
+            final = a.get("final", True) if bulk else True
+            batch = a.get("batch") if isinstance(a.get("batch"), (int, str)) else None
         
             dss = dsses.get(dss_name)
-            if busy["op"] != "copy" or busy["dss"] != dss_name or busy["user"] != owner:
+            if bulk and (dss_name, owner, batch) in copy_batches:
+                resp = dict(copy_batches[(dss_name, owner, batch)])
+            elif busy["op"] != "copy" or busy["dss"] != dss_name or busy["user"] != owner:
                 resp = {"status": "FAILURE", "error": "no copy in progress for this dss/user"}
-            elif not dss:
-                resp = {"status": "FAILURE", "error": "no such dss"}
             else:
-                try:
-                    size = int(size)
-                except Exception:
-                    size = -1
-                if size < 0:
-                    resp = {"status": "FAILURE", "error": "invalid size"}
+                if not dss:
+                    resp = {"status": "FAILURE", "error": "no such dss"}
+                    final = True
+                elif bulk:
+                    # Packs (shared stripes holding many small files) are registered
+                    # first so the file entries in the same batch can point into them.
+                    new_packs = []
+                    for p in a.get("packs") or []:
+                        try:
+                            name, psize = p["pack"], int(p["size"])
+                        except Exception:
+                            continue
+                        if name and name not in dss["packs"] and psize >= 0:
+                            dss["packs"][name] = {"size": psize, "live": 0, "owner": owner, "n": dss["n"]}
+                            new_packs.append(name)
+                    results = [dict(commit_file(dss, owner, e if isinstance(e, dict) else {}),
+                                    file_name=e.get("file_name") if isinstance(e, dict) else None)
+                               for e in entries]
+                    for name in new_packs:
+                        if dss["packs"][name]["live"] == 0:
+                            del dss["packs"][name]
+                            discard(dss, name)
+                    # Objects the client wrote but will not commit (failed writes, dropped packs).
+                    for obj in a.get("discard") or []:
+                        if isinstance(obj, str) and obj:
+                            discard(dss, obj)
+                    resp = {"status": "SUCCESS", "results": results}
+                    if batch is not None:
+                        copy_batches[(dss_name, owner, batch)] = dict(resp)
                 else:
-                    sha256 = a.get("sha256")
-                    dss["files"][file_name] = {"owner": owner, "size": size, "sha256": sha256}
-                    resp = {"status": "SUCCESS"}
+                    resp = commit_file(dss, owner, a)
+                if final:
+                    busy.update({"op": None, "dss": None, "user": None})
 
-            busy.update({"op": None, "dss": None, "user": None})
+        elif cmd == "copy-abort":
+            # Long object lists come in pages: only the final=true one releases the lock.
+            a = msg.get("args", {})
+            if busy["op"] != "copy" or busy["dss"] != a.get("dss_name") or busy["user"] != a.get("owner"):
+                resp = {"status": "FAILURE", "error": "no copy in progress for this dss/user"}
+            else:
+                dss = dsses.get(a.get("dss_name"))
+                for obj in (a.get("objects") or []) if dss else []:
+                    if isinstance(obj, str) and obj:
+                        discard(dss, obj)
+                if a.get("final", True):
+                    busy.update({"op": None, "dss": None, "user": None})
+                resp = {"status": "SUCCESS"}
 
         elif cmd == "read-prepare":
             a = msg.get("args", {})
@@ -173,32 +747,54 @@ def main():
                 elif user_name is not None and meta.get("owner") != user_name:
                     resp = {"status": "FAILURE", "error": "NOT_OWNER"}
                 else:
-                    disk_eps = []
-                    for dn in dss["disks"]:
-                        info = disks.get(dn)
-                        disk_eps.append({"disk_name": dn, "ip": info["ip"], "c_port": info["c_port"]})
+                    # Reads follow the layout the file (or its pack) is striped with
+                    # right now, so they keep working while a restripe is under way.
+                    pack = dss["packs"].get(meta.get("pack"))
+                    stored = pack or meta
                     resp = {
                         "status": "SUCCESS",
-                        "dss": {
-                            "dss_name": dss_name,
-                            "n": dss["n"],
-                            "striping_unit": dss["striping_unit"],
-                            "disks": disk_eps
-                        },
-                        "file": {"name": file_name, "size": meta["size"], "owner": meta["owner"], "sha256": meta.get("sha256")}
+                        "dss": dss_layout(dss_name, dss, disks, alive, stored["n"]),
+                        "file": {"name": file_name, "size": meta["size"], "owner": meta["owner"], "sha256": meta.get("sha256"),
+                                 "object": meta.get("object", file_name),
+                                 "pack": pack.get("object", meta["pack"]) if pack else None,
+                                 "extents": meta.get("extents")}
 
                     }
-                    reads_in_progress[dss_name] = reads_in_progress.get(dss_name, 0) + 1
+                    now = time.monotonic()
+                    if a.get("lease") and args.lease_seconds > 0 and now >= dss.get("lease_hold_until", 0):
+                        # The lease stands in for read-complete: it counts as a read
+                        # in progress until released or expired.
+                        if len(leases) >= LEASE_PRUNE:
+                            prune_leases(now)
+                        lid = next(lease_ids)
+                        leases[lid] = {"dss": dss_name, "epoch": dss["epoch"], "expires": now + args.lease_seconds}
+                        resp["lease"] = {"id": lid, "ttl": args.lease_seconds, "version": dss["version"]}
+                        statslib.incr(stats, "leases_granted")
+                    else:
+                        open_reads_by_epoch = reads_in_progress.setdefault(dss_name, {})
+                        open_reads_by_epoch[dss["epoch"]] = open_reads_by_epoch.get(dss["epoch"], 0) + 1
+                        resp["epoch"] = dss["epoch"]
 
-        
-        elif cmd == "read-complete":
+
+        elif cmd == "delete-file":
             a = msg.get("args", {})
             dss_name = a.get("dss_name")
-            if dss_name:
-                count = reads_in_progress.get(dss_name, 0)
-                if count > 0:
-                    reads_in_progress[dss_name] = count - 1
-            resp = {"status": "SUCCESS"}
+            file_name = a.get("file_name")
+            user_name = a.get("user_name")
+            dss = dsses.get(dss_name)
+            meta = dss["files"].get(file_name) if dss else None
+            if not dss:
+                resp = {"status": "FAILURE", "error": "no such dss"}
+            elif not meta:
+                resp = {"status": "FAILURE", "error": "file not found"}
+            elif user_name is not None and meta.get("owner") != user_name:
+                resp = {"status": "FAILURE", "error": "NOT_OWNER"}
+            else:
+                # Metadata goes at once; the blocks are reclaimed lazily.
+                release_file(dss, file_name)
+                del dss["files"][file_name]
+                dss["version"] += 1
+                resp = {"status": "SUCCESS"}
 
         elif cmd == "deregister-user":
             a = msg.get("args", {})
@@ -226,52 +822,156 @@ def main():
             dss = dsses.get(dss_name)
             if not dss:
                 resp = {"status": "FAILURE", "error": "no such dss"}
-            elif reads_in_progress.get(dss_name, 0) > 0:
+            elif open_reads(dss_name) > 0:
                 resp = {"status": "FAILURE", "error": "reads-in-progress"}
+            elif (dss.get("restripe") or {}).get("state") == "running":
+                resp = {"status": "FAILURE", "error": "restripe in progress"}
+            elif not all(alive(dn) for dn in dss["disks"]):
+                # Single parity covers one lost disk: failing a healthy one while
+                # another is down would leave two, and nothing could be rebuilt.
+                down = [dn for dn in dss["disks"] if not alive(dn)]
+                resp = {"status": "FAILURE", "error": f"disks not alive: {', '.join(down)}"}
             else:
                 busy.update({"op": "disk-failure", "dss": dss_name, "user": a.get("user_name")})
-        
-                disk_eps = []
-                for dn in dss["disks"]:
-                    info = disks.get(dn)
-                    disk_eps.append({"disk_name": dn, "ip": info["ip"], "c_port": info["c_port"]})
-        
+                # The objects to rebuild come a page at a time; rebuild-objects
+                # returns the rest from the offset given as objects_next.
+                objects = rebuild_objects(dss)
+                page, _ = take_page(objects, REPLY_PAGE_BYTES)
                 resp = {
                     "status": "SUCCESS",
-                    "dss": {
-                        "dss_name": dss_name,
-                        "n": dss["n"],
-                        "striping_unit": dss["striping_unit"],
-                        "disks": disk_eps
-                    },
-                    "files": dss["files"]
+                    "dss": dss_layout(dss_name, dss, disks, alive),
+                    "objects": page,
+                    "objects_next": len(page) if len(page) < len(objects) else None,
                 }
 
+        elif cmd == "rebuild-objects":
+            a = msg.get("args", {})
+            dss_name = a.get("dss_name")
+            if busy["op"] != "disk-failure" or busy["dss"] != dss_name:
+                resp = {"status": "FAILURE", "error": "no disk-failure in progress"}
+            else:
+                objects = rebuild_objects(dsses[dss_name])
+                try:
+                    offset = max(0, int(a.get("offset", 0)))
+                except (TypeError, ValueError):
+                    offset = 0
+                page, _ = take_page(objects[offset:], REPLY_PAGE_BYTES)
+                nxt = offset + len(page)
+                resp = {"status": "SUCCESS", "objects": page, "objects_next": nxt if nxt < len(objects) else None}
+
         elif cmd == "decommission-dss":
             a = msg.get("args", {})
             dss_name = a.get("dss_name")
             dss = dsses.get(dss_name)
             if not dss:
                 resp = {"status": "FAILURE", "error": "no such dss"}
-            elif reads_in_progress.get(dss_name, 0) > 0:
+            elif open_reads(dss_name) > 0:
                 resp = {"status": "FAILURE", "error": "reads-in-progress"}
+            elif (dss.get("restripe") or {}).get("state") == "running":
+                resp = {"status": "FAILURE", "error": "restripe in progress"}
             else:
                 busy.update({"op": "decommission", "dss": dss_name, "user": a.get("user_name")})
-                disk_eps = []
-                for dn in dss["disks"]:
-                    info = disks.get(dn)
-                    disk_eps.append({"disk_name": dn, "ip": info["ip"], "c_port": info["c_port"]})
                 resp = {
                     "status": "SUCCESS",
-                    "dss": {
-                        "dss_name": dss_name,
-                        "n": dss["n"],
-                        "striping_unit": dss["striping_unit"],
-                        "disks": disk_eps
-                    }
+                    "dss": dss_layout(dss_name, dss, disks, alive)
                 }
 
-        
+
+        elif cmd == "expand-dss":
+            a = msg.get("args", {})
+            dss_name = a.get("dss_name")
+            dss = dsses.get(dss_name)
+            try:
+                add = int(a.get("add", 1))
+                rate = float(a["rate_mbps"]) if a.get("rate_mbps") is not None else args.restripe_rate
+            except Exception:
+                add, rate = -1, -1
+            free = [name for name, info in disks.items() if info.get("state") == "Free" and alive(name)]
+            if not dss:
+                resp = {"status": "FAILURE", "error": "no such dss"}
+            elif add < 1 or rate < 0:
+                resp = {"status": "FAILURE", "error": "add must be >= 1 and rate_mbps >= 0"}
+            elif (dss.get("restripe") or {}).get("state") == "running":
+                resp = {"status": "FAILURE", "error": "restripe in progress"}
+            elif len(free) < add:
+                resp = {"status": "FAILURE", "error": "fewer than add alive disks with state Free"}
+            else:
+                chosen = sorted(free, key=lambda dn: placement_key(disks[dn]))[:add]
+                for dn in chosen:
+                    disks[dn]["state"] = f"InDSS:{dss_name}"
+                dss["disks"] = dss["disks"] + chosen
+                dss["n"] += add
+                dss["version"] += 1
+                # New files use the new width at once; existing ones move over in
+                # the background and are read at their recorded width until then.
+                # The copying is done by the least busy disk of the DSS, off this loop.
+                # started/finished are wall-clock times for display; updated is
+                # monotonic, for the stall check, as on peer-rebuild jobs.
+                objects = restripe_objects(dss)
+                runner = min((dn for dn in dss["disks"] if alive(dn)), key=lambda dn: placement_key(disks[dn]))
+                job = {"job": next(job_ids), "token": secrets.token_hex(4), "disk_name": runner,
+                       "state": "running" if objects else "done", "n": dss["n"], "total": len(objects),
+                       "done": 0, "failed": 0, "bytes": 0, "seq": 0, "rate_mbps": rate,
+                       "started": time.time(), "updated": time.monotonic()}
+                dss["restripe"] = job
+                if objects:
+                    layout = dss_layout(dss_name, dss, disks, alive)
+                    parts = [json.dumps(part).encode() for part in job_messages("restripe", {
+                        "job": job["job"], "token": job["token"], "dss": layout, "rate": rate * 1e6,
+                        "timeout": args.restripe_timeout}, objects)]
+                    target = (disks[runner]["ip"], disks[runner]["m_port"])
+                    error = send_job(target, parts)
+                    if error:
+                        job.update(state="failed", error=error, finished=time.time())
+                    else:
+                        restripe_sends[dss_name] = (target, parts)
+                        threading.Thread(target=job_watch, args=("restripe-tick", dss_name, job["job"], self_addr),
+                                         daemon=True).start()
+                resp = {"status": "SUCCESS", "dss": dss_layout(dss_name, dss, disks, alive), "restripe": job}
+
+        elif cmd == "peer-rebuild":
+            a = msg.get("args", {})
+            dss_name = a.get("dss_name")
+            dss = dsses.get(dss_name)
+            try:
+                idx = int(a.get("failed_index"))
+            except Exception:
+                idx = -1
+            if busy["op"] != "disk-failure" or busy["dss"] != dss_name:
+                resp = {"status": "FAILURE", "error": "no disk-failure in progress"}
+            elif not dss:
+                resp = {"status": "FAILURE", "error": "no such dss"}
+            elif not 0 <= idx < dss["n"]:
+                resp = {"status": "FAILURE", "error": "failed_index out of range"}
+            elif rebuilds.get(dss_name, {}).get("state") == "running":
+                resp = {"status": "FAILURE", "error": "peer rebuild already running"}
+            else:
+                target = disks[dss["disks"][idx]]
+                job = {"job": next(job_ids), "disk_name": dss["disks"][idx], "disk_index": idx,
+                       "done": 0, "total": None, "failed": 0, "state": "running",
+                       "started": time.time(), "updated": time.monotonic()}
+                rebuilds[dss_name] = job
+                parts = [json.dumps(part).encode() for part in job_messages("rebuild", {
+                    "job": job["job"], "token": secrets.token_hex(4),
+                    "dss": dss_layout(dss_name, dss, disks, alive), "disk_index": idx}, rebuild_objects(dss))]
+                error = send_job((target["ip"], target["m_port"]), parts)
+                if error:
+                    job.update(state="failed", error=error)
+                    resp = {"status": "FAILURE", "error": error}
+                else:
+                    rebuild_sends[dss_name] = ((target["ip"], target["m_port"]), parts)
+                    threading.Thread(target=job_watch, args=("rebuild-tick", dss_name, job["job"], self_addr),
+                                     daemon=True).start()
+                    resp = {"status": "SUCCESS", "rebuild": job}
+
+        elif cmd == "rebuild-status":
+            a = msg.get("args", {})
+            job = rebuilds.get(a.get("dss_name"))
+            if job is None:
+                resp = {"status": "FAILURE", "error": "no peer rebuild for this dss"}
+            else:
+                resp = {"status": "SUCCESS", "rebuild": job}
+
         elif cmd == "recovery-complete":
             a = msg.get("args", {})
             dss_name = a.get("dss_name")
@@ -300,9 +1000,11 @@ def main():
                     resp = {"status": "SUCCESS"}
                 busy.update({"op": None, "dss": None, "user": None})
         else:
+            cmd = "unsupported"
             resp = {"status":"FAILURE", "error":"unsupported"}
 
-        sock.sendto(json.dumps(resp).encode(), addr)
+        out = send_reply(msg, resp, addr)
+        statslib.record(stats, cmd, resp.get("status") == "SUCCESS", len(data), len(out), time.perf_counter_ns() - t0)
 
 if __name__ == "__main__":
     main()
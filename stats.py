@@ -0,0 +1,116 @@
+import os, time, threading
+
+# Latency histogram buckets are powers of two in microseconds: bucket i counts
+# requests that took < 2**i us, so the index is just elapsed_us.bit_length().
+NBUCKETS = 26
+
+def new_stats(enabled: bool = True) -> dict:
+    return {"enabled": enabled, "started": time.time(), "cmds": {}, "counters": {}}
+
+def reset(stats: dict) -> None:
+    stats["started"] = time.time()
+    stats["cmds"] = {}
+    stats["counters"] = {}
+
+def record(stats: dict, cmd: str, ok: bool, bytes_in: int, bytes_out: int, elapsed_ns: int) -> None:
+    """Account one handled request. Cheap enough to call on every block."""
+    if not stats["enabled"]:
+        return
+    c = stats["cmds"].get(cmd)
+    if c is None:
+        c = stats["cmds"][cmd] = {"count": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0,
+                                  "latency_ns": 0, "hist": [0] * NBUCKETS}
+    c["count"] += 1
+    if not ok:
+        c["errors"] += 1
+    c["bytes_in"] += bytes_in
+    c["bytes_out"] += bytes_out
+    c["latency_ns"] += elapsed_ns
+    c["hist"][min((elapsed_ns // 1000).bit_length(), NBUCKETS - 1)] += 1
+
+def incr(stats: dict, name: str, by: int = 1) -> None:
+    if stats["enabled"]:
+        stats["counters"][name] = stats["counters"].get(name, 0) + by
+
+def hist_quantile(hist: list[int], q: float) -> float:
+    """Upper bound (ms) of the bucket holding quantile q."""
+    total = sum(hist)
+    if not total:
+        return 0.0
+    want = q * total
+    seen = 0
+    for i, cnt in enumerate(hist):
+        seen += cnt
+        if seen >= want:
+            return (1 << i) / 1000.0
+    return (1 << (NBUCKETS - 1)) / 1000.0
+
+def snapshot(stats: dict) -> dict:
+    """JSON-friendly view of the counters, with p50/p99 estimated from the histograms."""
+    uptime = max(time.time() - stats["started"], 1e-9)
+    cmds = {}
+    for name, c in list(stats["cmds"].items()):
+        hist = list(c["hist"])
+        cmds[name] = {
+            "count": c["count"],
+            "errors": c["errors"],
+            "bytes_in": c["bytes_in"],
+            "bytes_out": c["bytes_out"],
+            "rate_per_s": round(c["count"] / uptime, 3),
+            "mean_ms": round(c["latency_ns"] / c["count"] / 1e6, 4) if c["count"] else 0.0,
+            "p50_ms": hist_quantile(hist, 0.50),
+            "p99_ms": hist_quantile(hist, 0.99),
+            "hist_us": {str(1 << i): cnt for i, cnt in enumerate(hist) if cnt},
+        }
+    return {"enabled": stats["enabled"], "uptime_s": round(uptime, 3),
+            "cmds": cmds, "counters": dict(stats["counters"])}
+
+def prometheus_text(stats: dict, prefix: str, labels: dict | None = None) -> str:
+    """Render the counters in the Prometheus text exposition format."""
+    base = ",".join(f'{k}="{v}"' for k, v in (labels or {}).items())
+    sep = "," if base else ""
+    lines = [
+        f"# TYPE {prefix}_requests_total counter",
+        f"# TYPE {prefix}_errors_total counter",
+        f"# TYPE {prefix}_bytes_in_total counter",
+        f"# TYPE {prefix}_bytes_out_total counter",
+        f"# TYPE {prefix}_latency_seconds histogram",
+    ]
+    for name, c in sorted(list(stats["cmds"].items())):
+        lbl = f'{base}{sep}cmd="{name}"'
+        lines.append(f"{prefix}_requests_total{{{lbl}}} {c['count']}")
+        lines.append(f"{prefix}_errors_total{{{lbl}}} {c['errors']}")
+        lines.append(f"{prefix}_bytes_in_total{{{lbl}}} {c['bytes_in']}")
+        lines.append(f"{prefix}_bytes_out_total{{{lbl}}} {c['bytes_out']}")
+        cum = 0
+        for i, cnt in enumerate(c["hist"]):
+            cum += cnt
+            if cnt:
+                lines.append(f'{prefix}_latency_seconds_bucket{{{lbl},le="{(1 << i) / 1e6:g}"}} {cum}')
+        lines.append(f'{prefix}_latency_seconds_bucket{{{lbl},le="+Inf"}} {cum}')
+        lines.append(f"{prefix}_latency_seconds_sum{{{lbl}}} {c['latency_ns'] / 1e9:.6f}")
+        lines.append(f"{prefix}_latency_seconds_count{{{lbl}}} {c['count']}")
+    for name, v in sorted(list(stats["counters"].items())):
+        metric = f"{prefix}_{name.replace('-', '_')}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{{{base}}} {v}")
+    return "\n".join(lines) + "\n"
+
+def dump_file(stats: dict, path: str, prefix: str, labels: dict | None = None) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text(stats, prefix, labels))
+    os.replace(tmp, path)
+
+def start_dumper(stats: dict, path: str, prefix: str, labels: dict | None = None, interval: float = 10.0):
+    """Rewrite the Prometheus text file every interval seconds from a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_file(stats, path, prefix, labels)
+            except OSError as e:
+                print("stats dump failed:", e)
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+    return t
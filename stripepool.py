@@ -0,0 +1,117 @@
+import asyncio, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from striping import encode_stripe, encode_block, xor_bytes
+
+TASK_BYTES = 256 * 1024  # data handed to one worker call: enough to amortise the round trip
+
+# -- worker side ---------------------------------------------------------------
+# These run in the pool processes. Inputs arrive through a shared-memory segment
+# named by the caller, so only small arguments and the encoded wire fields are
+# pickled; each call attaches, works and detaches.
+
+def _ready():
+    return True
+
+def _encode_stripes(shm_name, size, first, last, n, b, codec):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = shm.buf[:size]
+    try:
+        return [[encode_block(blk, codec) for blk in encode_stripe(data, s, n, b)]
+                for s in range(first, last)]
+    finally:
+        data.release()
+        shm.close()
+
+def _xor_encode(shm_name, slots, count, b, codec):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = []
+        for off in slots:
+            blocks = [bytes(shm.buf[off + i * b:off + (i + 1) * b]) for i in range(count)]
+            out.append(encode_block(xor_bytes(blocks, b), codec))
+        return out
+    finally:
+        shm.close()
+
+# -- caller side ---------------------------------------------------------------
+
+class StripePool:
+    """Process pool for the CPU half of striping: parity, padding, compression
+    and base64. Work is submitted from the event loop and results come back as
+    awaitables, so the caller keeps its stripes in order and overlaps the
+    encoding of later stripes with the network I/O of earlier ones."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        # spawn, not fork: the client usually runs its event loop on a thread.
+        self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def start(self):
+        """Bring the workers up now rather than on the first large copy."""
+        await asyncio.gather(*(self._run(_ready) for _ in range(self.workers)))
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def encode_file(self, data: bytes, n: int, b: int, codec: dict | None, stripes: int):
+        """Yield (stripe_idx, wire fields per disk) for every stripe of data, in
+        order, keeping up to two tasks per worker in flight ahead of the consumer."""
+        if not stripes:
+            return
+        step = max(1, TASK_BYTES // ((n - 1) * b))
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        pending = []
+        try:
+            shm.buf[:len(data)] = data
+            starts = iter(range(0, stripes, step))
+            for first in starts:
+                pending.append((first, self._run(_encode_stripes, shm.name, len(data), first,
+                                                 min(stripes, first + step), n, b, codec)))
+                if len(pending) >= 2 * self.workers:
+                    break
+            while pending:
+                first, fut = pending.pop(0)
+                stripes_out = await fut
+                nxt = next(starts, None)
+                if nxt is not None:
+                    pending.append((nxt, self._run(_encode_stripes, shm.name, len(data), nxt,
+                                                   min(stripes, nxt + step), n, b, codec)))
+                for i, fields in enumerate(stripes_out):
+                    yield first + i, fields
+        finally:
+            # Segments must outlive every task that was handed their name.
+            if pending:
+                await asyncio.gather(*(f for _, f in pending), return_exceptions=True)
+            shm.close()
+            shm.unlink()
+
+    async def rebuild_blocks(self, stripes: list[list[bytes]], b: int, codec: dict | None) -> list[dict]:
+        """Wire fields for the XOR of each stripe's surviving blocks, in order."""
+        if not stripes:
+            return []
+        count = len(stripes[0])
+        shm = shared_memory.SharedMemory(create=True, size=len(stripes) * count * b)
+        futs = []
+        try:
+            per = max(1, len(stripes) // self.workers)
+            for first in range(0, len(stripes), per):
+                slots = []
+                for s in range(first, min(len(stripes), first + per)):
+                    off = s * count * b
+                    for i, blk in enumerate(stripes[s]):
+                        shm.buf[off + i * b:off + (i + 1) * b] = blk
+                    slots.append(off)
+                futs.append(self._run(_xor_encode, shm.name, slots, count, b, codec))
+            out = []
+            for part in await asyncio.gather(*futs):
+                out.extend(part)
+            return out
+        finally:
+            if futs:
+                await asyncio.gather(*futs, return_exceptions=True)
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,102 @@
+import base64, binascii, zlib
+
+def blocks_per_stripe(n: int) -> int:
+    return n - 1
+
+def total_stripes_for_size(file_size: int, n: int, b: int) -> int:
+    denom = blocks_per_stripe(n) * b
+    return (file_size + denom - 1) // denom
+
+def pad_to(bsize: int, data: bytes) -> bytes:
+    """data (bytes or a memoryview) cut or zero-padded to exactly bsize bytes."""
+    if len(data) >= bsize:
+        return bytes(data[:bsize])
+    return bytes(data) + bytes(bsize - len(data))
+
+def xor_bytes(chunks: list[bytes], b: int) -> bytearray:
+    """XOR of the chunks, returned as the working bytearray rather than copied to bytes."""
+    out = bytearray(b)
+    for ch in chunks:
+        for i in range(b):
+            out[i] ^= ch[i]
+    return out
+
+def parity_disk(n: int, stripe_idx: int) -> int:
+    return n - (((stripe_idx % n) + 1))
+
+def data_disk_order(n: int, stripe_idx: int):
+    p = parity_disk(n, stripe_idx)
+    return [i for i in range(n) if i != p]
+
+def b64d(s: str | bytes) -> bytes:
+    # a2b_base64 reads an ASCII str in place; base64.b64decode would first
+    # encode it to a bytes copy.
+    return binascii.a2b_base64(s)
+
+def encode_stripe(data: bytes, stripe_idx: int, n: int, b: int) -> list[bytes]:
+    """Zero-padded data blocks plus parity for one stripe, indexed by disk."""
+    k = blocks_per_stripe(n)
+    base = stripe_idx * k * b
+    return stripe_blocks(memoryview(data)[base:base + k * b], stripe_idx, n, b)
+
+def stripe_blocks(area: bytes, stripe_idx: int, n: int, b: int) -> list[bytes]:
+    """Like encode_stripe, given only the stripe's own (up to (n-1)*b byte) data area."""
+    p = parity_disk(n, stripe_idx)
+    k = blocks_per_stripe(n)
+    chunks = [pad_to(b, area[i * b:(i + 1) * b]) for i in range(k)]
+    parity = xor_bytes(chunks, b)
+    it = iter(chunks)
+    return [parity if i == p else next(it) for i in range(n)]
+
+def pack_block(block: bytes, codec: dict | None) -> tuple[str | None, bytes]:
+    """(enc, payload) for one logical block under a DSS's codec options.
+
+    An all-zero block becomes a hole (no payload) when codec["holes"] is set;
+    with codec["compress"] == "zlib" the block is deflated, falling back to the
+    raw bytes when that does not make it smaller. Parity is always computed
+    over the logical block, before this step.
+    """
+    if codec:
+        if codec.get("holes") and block.count(0) == len(block):
+            return "hole", b""
+        if codec.get("compress") == "zlib":
+            z = zlib.compress(block, codec.get("level", 1))
+            if len(z) < len(block):
+                return "zlib", z
+    return None, block
+
+def unpack_block(enc: str | None, payload: bytes, b: int) -> bytes:
+    """Inverse of pack_block: the logical b-byte block."""
+    if enc == "hole":
+        return bytes(b)
+    if enc == "zlib":
+        return zlib.decompress(payload)
+    return payload
+
+def encode_block(block: bytes, codec: dict | None) -> dict:
+    """Wire fields for one logical block (see pack_block). block_b64 is left as
+    ASCII bytes for blockio.encode_msg to splice into the datagram."""
+    enc, payload = pack_block(block, codec)
+    if enc == "hole":
+        return {"enc": "hole", "len": len(block)}
+    fields = {"block_b64": base64.b64encode(payload)}
+    if enc:
+        fields["enc"] = enc
+    return fields
+
+def decode_block(fields: dict, b: int) -> bytes:
+    """Inverse of encode_block: the logical b-byte block."""
+    enc = fields.get("enc")
+    return unpack_block(enc, b"" if enc == "hole" else b64d(fields["block_b64"]), b)
+
+def pack_extents(offset: int, length: int, stripe_data: int) -> list[list[int]]:
+    """Split the byte range [offset, offset+length) of a pack into per-stripe
+    [stripe, offset_in_stripe, length] extents; stripe_data is (n-1)*striping_unit."""
+    extents = []
+    while length > 0:
+        stripe, off = divmod(offset, stripe_data)
+        take = min(length, stripe_data - off)
+        extents.append([stripe, off, take])
+        offset += take
+        length -= take
+    return extents
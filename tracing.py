@@ -0,0 +1,127 @@
+import json, time, random
+import itertools, contextvars
+from collections import deque
+
+LEVELS = {"off": 0, "error": 1, "info": 2, "debug": 3}
+
+_cfg = {"level": LEVELS["info"], "sample": 1.0, "echo": False}
+_ring = deque(maxlen=4096)
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+def configure(level: str = "info", sample: float = 1.0, buffer: int = 4096, echo: bool = False) -> None:
+    """Set the global trace level, root-span sampling rate, ring size and stdout echo."""
+    global _ring
+    if level not in LEVELS:
+        raise ValueError(f"trace level must be one of {', '.join(LEVELS)}")
+    _cfg["level"] = LEVELS[level]
+    _cfg["sample"] = max(0.0, min(1.0, float(sample)))
+    _cfg["echo"] = echo
+    if buffer != _ring.maxlen:
+        _ring = deque(_ring, maxlen=max(1, int(buffer)))
+
+def add_args(ap) -> None:
+    ap.add_argument("--trace-level", default="info", choices=list(LEVELS))
+    ap.add_argument("--trace-sample", type=float, default=1.0, help="fraction of root spans to record")
+    ap.add_argument("--trace-buffer", type=int, default=4096, help="trace ring buffer size (records)")
+    ap.add_argument("--trace-echo", action="store_true", help="also print every trace record to stdout")
+
+def configure_from_args(args) -> None:
+    configure(args.trace_level, args.trace_sample, args.trace_buffer, args.trace_echo)
+
+def _emit(rec: dict) -> None:
+    _ring.append(rec)
+    if _cfg["echo"]:
+        print(rec)
+
+class _NoopSpan:
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def set(self, **fields):
+        pass
+
+NOOP = _NoopSpan()
+
+class Span:
+    __slots__ = ("name", "fields", "id", "parent", "t0", "ts", "token")
+
+    def __init__(self, name, parent, fields):
+        self.name = name
+        self.fields = fields
+        self.id = next(_ids)
+        self.parent = parent
+
+    def __enter__(self):
+        self.ts = time.time()
+        self.t0 = time.perf_counter()
+        self.token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter() - self.t0
+        _current.reset(self.token)
+        rec = {"ts": round(self.ts, 6), "span": self.name, "id": self.id,
+               "parent": self.parent.id if self.parent else None,
+               "dur_ms": round(dur * 1000, 3), **self.fields}
+        if exc_type is not None:
+            rec["error"] = repr(exc)
+        _emit(rec)
+        return False
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+def span(name: str, level: str = "info", **fields):
+    """Context manager timing one phase. Root spans are sampled; children follow their root."""
+    if LEVELS[level] > _cfg["level"]:
+        return NOOP
+    parent = _current.get()
+    if parent is NOOP:
+        return NOOP
+    if parent is None and _cfg["sample"] < 1.0 and random.random() >= _cfg["sample"]:
+        return _Unsampled()
+    return Span(name, parent, fields)
+
+class _Unsampled:
+    """Root span that lost the sampling draw: suppresses its whole subtree."""
+    __slots__ = ("token",)
+    def __enter__(self):
+        self.token = _current.set(NOOP)
+        return NOOP
+    def __exit__(self, *exc):
+        _current.reset(self.token)
+        return False
+
+def event(level: str, name: str, **fields) -> None:
+    """Record a point event, attached to the current span if there is one."""
+    if LEVELS[level] > _cfg["level"]:
+        return
+    parent = _current.get()
+    if parent is NOOP:
+        return
+    if parent is None and _cfg["sample"] < 1.0 and random.random() >= _cfg["sample"]:
+        return
+    _emit({"ts": round(time.time(), 6), "event": name,
+           "parent": parent.id if parent else None, **fields})
+
+def bind(fn):
+    """Wrap fn so a worker thread runs it inside the caller's trace context.
+    Call once per thread: a captured context can only be entered by one thread at a time."""
+    ctx = contextvars.copy_context()
+    return lambda *a, **kw: ctx.run(fn, *a, **kw)
+
+def records() -> list[dict]:
+    return list(_ring)
+
+def dump(path: str, clear: bool = False) -> int:
+    """Write the ring buffer as JSON lines; return how many records were written."""
+    recs = list(_ring)
+    with open(path, "w") as f:
+        for rec in recs:
+            f.write(json.dumps(rec, default=str) + "\n")
+    if clear:
+        _ring.clear()
+    return len(recs)